@@ -0,0 +1,57 @@
+from resistivity.Device.MultiPyVu import Server, Client
+from resistivity.Device.MultiPyVu.SocketMessage import Message
+import numpy as np
+import socket
+import time
+
+## Latency of the MultiVu requests, with the JSON and the binary messages,
+## on a server in scaffolding mode (no MultiVu needed)
+
+n_requests = 1000
+port = 5050
+
+def latencies(request, n=n_requests):
+    """Latency of each call of request, in microseconds"""
+    times = np.empty(n)
+    for i in range(n):
+        start = time.perf_counter()
+        request()
+        times[i] = time.perf_counter() - start
+    return 1e6 * times
+
+def report(name, times):
+    print("%-28s mean %7.1f us   median %7.1f us   99%% %7.1f us"
+          % (name, times.mean(), np.median(times), np.percentile(times, 99)))
+
+
+## Encoding and decoding of one message, without the socket
+sock_a, sock_b = socket.socketpair()
+message = Message(sock_a)
+content = {'action': 'TEMP?', 'query': '', 'result': '300.0,K,1,Stable'}
+for binary in (False, True):
+    message.binary = binary
+    encoded = message._encode_content(content)
+    def round_trip():
+        message._recv_buffer = message._encode_content(content)
+        message.pop_message()
+    name = "binary" if binary else "JSON"
+    print(name + " message: " + str(len(encoded)) + " bytes")
+    report("  encode + decode", latencies(round_trip, 10 * n_requests))
+sock_a.close()
+sock_b.close()
+
+## Requests to the server
+server = Server(['-s', 'PPMS'], port=port)
+server.open()
+for binary in (False, True):
+    client = Client(port=port, binary=binary)
+    client.open()
+    client.log_event.remove()
+    print("binary messages:" if client._message.binary else "JSON messages:")
+    report("  get_temperature", latencies(client.get_temperature))
+    report("  get_field", latencies(client.get_field))
+    report("  get_state_snapshot", latencies(client.get_state_snapshot))
+    report("  get_states (pipelined)", latencies(client.get_states))
+    print("  server latency:", server.client_stats()[-1])
+    client.close_client()
+server.close()
@@ -415,6 +415,39 @@ class TemperatureController(GenericInstrument):
         """
         return float(self.query(f"KRDG? {input_channel}"))
 
+    def get_all_kelvin_reading(self):
+        """Returns the temperature values in kelvin of all the input channels, in one query.
+
+            Returns:
+                (list of float):
+                    The readings of the input channels, in the order of the channels.
+
+        """
+        return [float(value) for value in self.query("KRDG? 0").split(",")]
+
+    def get_readings(self, input_channels=(), heater_outputs=()):
+        """Returns kelvin readings and heater outputs of several channels in one transaction.
+
+            All the queries are joined in a single message, so this costs one round trip and one error check.
+
+            Args:
+                input_channels (list):
+                    The channels to retrieve the temperature from.
+                heater_outputs (list of int):
+                    The heater outputs to retrieve, in percent.
+
+            Returns:
+                (tuple):
+                    The list of the temperatures in kelvin and the list of the heater outputs.
+
+        """
+        queries = [f"KRDG? {input_channel}" for input_channel in input_channels]
+        queries += [f"HTR? {output}" for output in heater_outputs]
+        if not queries:
+            return [], []
+        values = [float(value) for value in self.query(*queries).split(";")]
+        return values[:len(input_channels)], values[len(input_channels):]
+
     def get_sensor_reading(self, input_channel):
         """Returns the sensor reading in the sensor's units.
 
@@ -112,7 +112,8 @@ class Config(object):
 
     @property
     def children(self):
-        return ReadWriteParameter.instances + ReadOnlyParameter.instances
+        # the parameters of this object only, each MCL has its own
+        return [value for value in vars(self).values() if isinstance(value, ReadOnlyParameter)]
 
 
 
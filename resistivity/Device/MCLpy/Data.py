@@ -14,4 +14,5 @@ class Data(object):
 
     @property
     def children(self):
-        return ReadOnlyParameter.instances
+        # the parameters of this object only, each MCL has its own
+        return [value for value in vars(self).values() if isinstance(value, ReadOnlyParameter)]
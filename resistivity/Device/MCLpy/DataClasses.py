@@ -1,7 +1,10 @@
 from resistivity.Device.MCLpy.ReadWriteValues import ReadOnlyParameter
-from collections import namedtuple
+from collections import deque
+from itertools import islice
+from time import time
 import struct
 import threading
+import numpy as np
 
 try:
     import xml.etree.cElementTree as ET
@@ -11,9 +14,34 @@ except ImportError:
 __all__ = ['LockInData', 'Scope', 'FFT']
 
 
+## Layout of the 888 bytes lock-in data frame (big endian)
+_module_dtype = np.dtype([('digitalInf_hz', '>f8'), ('digitaloutf_hz', '>f8'),
+                          ('amplitude_vrms', '>f8'), ('outputoffset_v', '>f8')])
+_general_readings = ['dt_s', 'cyclespersample', 'syncindex', 'time_s', 'lockinf_hz',
+                     'pll1_hz', 'pll2_hz', 'composite1_hz']
+lockin_frame_dtype = np.dtype([('dc_n', '>u4'), ('dc', '>f8', 16),
+                               ('x_n', '>u4'), ('x', '>f8', 16),
+                               ('y_n', '>u4'), ('y', '>f8', 16),
+                               ('r_n', '>u4'), ('r', '>f8', 16),
+                               ('thetadeg_n', '>u4'), ('thetadeg', '>f8', 16),
+                               ('dt_s', '>f8'), ('cyclespersample', '>f8'), ('syncindex', '>f8'),
+                               ('time_s', '>f8'), ('lockinf_hz', '>f8'),
+                               ('moduledata_n', '>u4'), ('moduledata', _module_dtype, 5),
+                               ('pll1_hz', '>f8'), ('pll2_hz', '>f8'), ('composite1_hz', '>f8')])
+
+
+def _empty_lockin_frame():
+    frame = np.zeros(1, dtype=lockin_frame_dtype)
+    for name in ['dc', 'x', 'y', 'r', 'thetadeg'] + _general_readings:
+        frame[name] = np.nan
+    for name in _module_dtype.names:
+        frame['moduledata'][name] = np.nan
+    return frame[0] # a record, as the received frames
 
 
 class LockInData(ReadOnlyParameter):
+    history_length = 10000 # number of frames kept in the history, about 9 MB
+
     def __init__(self, index):
         super().__init__('MCL_LIData_datareadings',
                          ['generalreadings', 'moduledata', 'dc', 'x', 'y', 'r', 'thetadeg'],
@@ -22,18 +50,19 @@ class LockInData(ReadOnlyParameter):
                          '>d?d',
                          3,
                          0 + index)
-        self.general_readings_nt = namedtuple('MCL_LIData_generalreadings',
-                                              ['dt_s', 'cyclespersample', 'syncindex', 'time_s', 'lockinf_hz',
-                                               'pll1_hz', 'pll2_hz', 'composite1_hz'])
-        self.module_data_nt = namedtuple('MCL_LIData_moduledata',
-                                         ['digitalInf_hz', 'digitaloutf_hz', 'amplitude_vrms', 'outputoffset_v'])
-
+        self._val = _empty_lockin_frame()
         self.lockin_set = index
+        ## History of the frames, filled only when recording is True
+        self.recording = False
+        self.history = deque(maxlen=self.history_length) # (timestamp, frame)
+        self.frame_count = 0 # number of frames added to the history
+        self._history_lock = threading.Lock()
 
     def receive(self, chunks):
         """
-        Handles incoming data by breaking the chunks down and assembling named tuples.
-        It then stores these tuples appropriately, making the values ready for data access
+        Handles incoming data by decoding the frame as a numpy record (see
+        lockin_frame_dtype). The record is a view on chunks, nothing is copied,
+        and it is stored as the latest values
         Parameters
         ----------
         chunks : byte data
@@ -43,36 +72,35 @@ class LockInData(ReadOnlyParameter):
         -------
 
         """
-        # todo(Holger) check my description is correct
-        if(len(chunks) < 888):
+        if(len(chunks) < lockin_frame_dtype.itemsize):
             return
-        general_readings = self.general_readings_nt._make(struct.unpack('>8d', chunks[660:700] + chunks[864:888]))
-        module_data = []
-        module_data_container = struct.unpack('>I', chunks[700:704])[0]
-        module_data_start_index = 704  # to 864
-        for i in range(module_data_container):
-            module_data.append(self.module_data_nt._make(
-                struct.unpack('>4d', chunks[module_data_start_index + 32 * i:module_data_start_index + 32 * i + 32])))
-        # x_container = struct.unpack('>I', chunks[0:4])[0]
-        fmt = ">%dd" % 16
-        dc = list(struct.unpack(fmt, chunks[4:132]))
-        x = list(struct.unpack(fmt, chunks[136:264]))
-        y = list(struct.unpack(fmt, chunks[268:396]))
-        r = list(struct.unpack(fmt, chunks[400:528]))
-        theta = list(struct.unpack(fmt, chunks[532:660]))
-
-        self._val = self._data_tuple(generalreadings=general_readings,
-                                     moduledata=module_data,
-                                     dc=dc,
-                                     x=x,
-                                     y=y,
-                                     r=r,
-                                     thetadeg=theta)
-        self._notify_observers(self._val)
-
-    def _notify_observers(self, data_readings):
-        for callback in self._callbacks.copy():
-            threading.Thread(target=callback, args=(self.lockin_set, data_readings, self._callbacks[callback])).start()
+        self._val = np.frombuffer(chunks, dtype=lockin_frame_dtype, count=1)[0]
+        if self.recording:
+            with self._history_lock:
+                self.history.append((time(), self._val))
+                self.frame_count += 1
+        self._notify_observers(self.lockin_set, self._val)
+
+    def get_history(self, since=0):
+        """
+        Returns the frames added to the history after the first since ones,
+        as a list of (timestamp, frame), and the number of frames added so far.
+        Each reader keeps its own count, so several readers get all the frames,
+        unless they are older than the history_length last ones
+        Parameters
+        ----------
+        since : int
+            the number of frames added when the history was last read
+
+        Returns
+        -------
+        frames : list
+        frame_count : int
+        """
+        with self._history_lock:
+            n_frames = min(self.frame_count - since, len(self.history))
+            frames = list(islice(self.history, len(self.history) - n_frames, None))
+            return frames, self.frame_count
 
     @property
     def general_readings(self):
@@ -80,12 +108,12 @@ class LockInData(ReadOnlyParameter):
         Getter for the general readings named tuple
         Returns
         -------
-        general_readings : namedtuple('MCL_LIData_generalreadings',
-                                              'dt_s cyclespersample syncindex time_s lockinf_hz pll1_hz pll2_hz '
-                                              'composite1_hz')
-            named tuple containing all values from the module_data branch of LIData
+        general_readings : numpy record with the fields
+                                              dt_s cyclespersample syncindex time_s lockinf_hz pll1_hz pll2_hz
+                                              composite1_hz
+            record containing all values from the general readings branch of LIData
         """
-        return self._val.generalreadings
+        return self._val[_general_readings]
 
     @property
     def module_data(self):
@@ -93,11 +121,11 @@ class LockInData(ReadOnlyParameter):
         Getter for the module data named tuple
         Returns
         -------
-        module_data : namedtuple('MCL_LIData_moduledata',
-                                         'digitalInf_hz digitaloutf_hz amplitude_vrms outputoffset_v')
-            named tuple containing all values from the module_data branch of LIData
+        module_data : numpy array of records with the fields
+                                         digitalInf_hz digitaloutf_hz amplitude_vrms outputoffset_v
+            one record per module, containing all values from the module_data branch of LIData
         """
-        return self._val.module_data
+        return self._val['moduledata'][:self._val['moduledata_n']]
 
     @property
     def dc(self):
@@ -108,7 +136,7 @@ class LockInData(ReadOnlyParameter):
         dc: float
             DC offset in Volts
         """
-        return self._val.dc
+        return self._val['dc']
 
     @property
     def x(self):
@@ -119,7 +147,7 @@ class LockInData(ReadOnlyParameter):
         x : float
             x value in Volts
         """
-        return self._val.x
+        return self._val['x']
 
     @property
     def y(self):
@@ -130,7 +158,7 @@ class LockInData(ReadOnlyParameter):
         y : float
             y value in Volts
         """
-        return self._val.y
+        return self._val['y']
 
     @property
     def r(self):
@@ -141,7 +169,7 @@ class LockInData(ReadOnlyParameter):
         r : float
             r value in Volts
         """
-        return self._val.r
+        return self._val['r']
 
     @property
     def theta(self):
@@ -152,7 +180,7 @@ class LockInData(ReadOnlyParameter):
         theta : float
             theta value in degrees
         """
-        return self._val.thetadeg
+        return self._val['thetadeg']
 
     @property
     def time_step(self):
@@ -163,7 +191,7 @@ class LockInData(ReadOnlyParameter):
         dt_s : float
             time step value in seconds
         """
-        return self._val.generalreadings.dt_s
+        return self._val['dt_s']
 
     @property
     def measurement_rate(self):
@@ -174,7 +202,7 @@ class LockInData(ReadOnlyParameter):
         rate : int
             Number of frequency cycles per measurement
         """
-        return self._val.generalreadings.cyclespersample
+        return self._val['cyclespersample']
 
     @property
     def integration_time(self):
@@ -196,7 +224,7 @@ class LockInData(ReadOnlyParameter):
         frequency: float
             lock in frequency in Hz
         """
-        return self._val.generalreadings.lockinf_hz
+        return self._val['lockinf_hz']
 
     @property
     def time(self):
@@ -207,7 +235,7 @@ class LockInData(ReadOnlyParameter):
         time : float
             instrument time for latest values in seconds
         """
-        return self._val.generalreadings.time_s
+        return self._val['time_s']
 
     @property
     def input_frequency(self):
@@ -218,7 +246,7 @@ class LockInData(ReadOnlyParameter):
         input_frequency : float
             external input frequency in Hz
         """
-        return self._val.module_data.digitalInf_hz
+        return self.module_data['digitalInf_hz']
 
     @property
     def output_frequency(self):
@@ -229,7 +257,7 @@ class LockInData(ReadOnlyParameter):
         output_frequency : float
             external output frequency in Hz
         """
-        return self._val.module_data.digitaloutf_hz
+        return self.module_data['digitaloutf_hz']
 
     @property
     def output_amplitude(self):
@@ -240,7 +268,7 @@ class LockInData(ReadOnlyParameter):
         output_amplitude : float
             external output amplitude in Volts RMS
         """
-        return self._val.module_data.amplitude_vrms
+        return self.module_data['amplitude_vrms']
 
     @property
     def output_offset(self):
@@ -251,7 +279,7 @@ class LockInData(ReadOnlyParameter):
         output_offset : float
             external output offset in Volts
         """
-        return self._val.module_data.outputoffset_v
+        return self.module_data['outputoffset_v']
 
 
 class Scope(ReadOnlyParameter):
@@ -265,16 +293,65 @@ class Scope(ReadOnlyParameter):
                          4,
                          0)
         self.is_fft = False
+        self._metadata_cache = {} # XML metadata: parsed values
+
+    metadata_cache_size = 16 # number of parsed metadata kept
 
     def receive(self, chunks):
+        """
+        Handles incoming data: the samples are decoded as a numpy array, with
+        one view per channel, and the XML metadata is parsed only if it was
+        not received recently
+        Parameters
+        ----------
+        chunks : byte data
+            the incoming data in raw byte chunks
+
+        Returns
+        -------
+
+        """
         array_len = struct.unpack('>Q', chunks[4:12])[0]
         array_end = 12 + array_len * 8
-        data_length = len(chunks)
-        format_string = ">%dd" % array_len
-        values = list(struct.unpack(format_string, chunks[12:array_end]))
+        values = np.frombuffer(chunks, dtype='>f8', count=array_len, offset=12)
+
+        metadata = bytes(chunks[array_end:])
+        if metadata not in self._metadata_cache:
+            if len(self._metadata_cache) >= self.metadata_cache_size:
+                self._metadata_cache.clear()
+            self._metadata_cache[metadata] = self._parse_metadata(metadata)
+        val = self._metadata_cache[metadata]
+        if (self.is_fft):
+            chunksize = int(val['scopesamples'] / 2)
+        else:
+            chunksize = val['scopesamples']
+        data = []
+        dataindex = 0
+        for active in val['channelstoreturn']:
+            if active:
+                data.append(values[dataindex * chunksize:(dataindex + 1) * chunksize])
+                dataindex += 1
+            else:
+                data.append(values[:0])
 
-        metadata = chunks[array_end:data_length].decode('ascii').rstrip('\0')
-        xml = ET.fromstring(metadata)
+        self._val = self._data_tuple(data=data, **val)
+        self._notify_observers(val['waveformtype'], self._val)
+
+    @staticmethod
+    def _parse_metadata(metadata):
+        """
+        Reads the values of the XML metadata of a waveform
+        Parameters
+        ----------
+        metadata : bytes
+            the XML metadata
+
+        Returns
+        -------
+        val : dict
+            the fields of the data tuple, except data
+        """
+        xml = ET.fromstring(metadata.decode('ascii').rstrip('\0'))
         dt_s = float(xml.find("./DBL/[Name='dt (s)']/Val").text)
         averages_completed = float(xml.find("./DBL/[Name='averages completed']/Val").text)
         df_hz = float(xml.find("./DBL/[Name='df (Hz)']/Val").text)
@@ -289,23 +366,11 @@ class Scope(ReadOnlyParameter):
             int(xml.find("./Cluster/Boolean/[Name='Return output instead of Imeas']/Val").text))
         channels_to_return = []
         channels_to_return_label = []
-        data = []
-        dataindex = 0
-        if (self.is_fft):
-            chunksize = int(scope_samples / 2)
-        else:
-            chunksize = scope_samples
         for i in xml.findall("./Cluster/Cluster/[Name='Channels to return']/Boolean"):
             channels_to_return_label.append(i.find("Name").text)
-            active = bool(int(i.find("Val").text))
-            channels_to_return.append(active)
-            if active:
-                data.append(values[dataindex * chunksize:(dataindex + 1) * chunksize])
-                dataindex += 1
-            else:
-                data.append([])
+            channels_to_return.append(bool(int(i.find("Val").text)))
 
-        self._val = self._data_tuple(
+        return dict(
             dt_s=dt_s,
             averages_completed=averages_completed,
             df_hz=df_hz,
@@ -316,14 +381,8 @@ class Scope(ReadOnlyParameter):
             samplingreductionfactor=sampling_reduction_factor,
             scopesamples=scope_samples,
             averagebetweensamples=average_between_samples,
-            returnoutputinsteadofimeas=returnoutputinsteadofimeas,
-            data=data
+            returnoutputinsteadofimeas=returnoutputinsteadofimeas
         )
-        self._notify_observers(waveform_type, self._val)
-
-    def _notify_observers(self, waveformtype, val):
-        for callback in self._callbacks.copy():
-            threading.Thread(target=callback, args=(waveformtype, val, self._callbacks[callback])).start()
 
     @property
     def dt_s(self):
@@ -0,0 +1,56 @@
+import queue
+import threading
+
+__all__ = ['Dispatcher']
+
+
+class Dispatcher:
+    """
+    Calls the callbacks of the data classes in one worker thread, in the order
+    the data was received, instead of one new thread per callback and frame.
+    The calls wait in a bounded queue. When the callbacks are slower than the
+    data, the queue gets full: the new calls are dropped and counted in
+    dropped, or the reading thread waits if block is True.
+    """
+
+    def __init__(self, maxsize=1000, block=False):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.block = block
+        self.dispatched = 0 # number of calls made
+        self.dropped = 0 # number of calls dropped because the queue was full
+        self.errors = 0 # number of calls which raised an exception
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def dispatch(self, callback, args):
+        """
+        Queue a call of callback(*args). Returns False if it was dropped
+        """
+        self._start()
+        try:
+            self.queue.put((callback, args), block=self.block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            callback, args = self.queue.get()
+            try:
+                callback(*args)
+            except Exception as error:
+                self.errors += 1
+                print("Error in the callback " + getattr(callback, '__name__', str(callback)) + ": " + str(error))
+            self.dispatched += 1
+            self.queue.task_done()
+
+    def join(self):
+        """Waits until all the queued calls are made"""
+        self.queue.join()
@@ -1,5 +1,6 @@
 import json
 import queue
+from concurrent.futures import Future
 import socket
 import struct
 import sys
@@ -26,13 +27,19 @@ class MCL:
     -------
     findSystems()
         Detect MCL systems on the local network
-    connect(mcl_ip)
+    connect(mcl_ip, timeout, wait_sync, progress)
         Connect to the MCL system
+    connect_async(mcl_ip, timeout, progress)
+        Connect to the MCL system in the background, returns a Future
+    wait_sync(timeout)
+        Wait until the config variables are synced
     disconnect(mcl_ip)
         Disconnect from the MCL system
 
     """
 
+    read_buffer_size = 1048576  # bytes, the buffer grows for larger messages
+
     def __init__(self):
         MIN_PYTHON = (3, 7)
         if sys.version_info < MIN_PYTHON:
@@ -45,6 +52,10 @@ class MCL:
 
         self.config = Config(self._write_queue)
         self.data = Data()
+        # config variables received from the system after connecting
+        self.synced = threading.Event()
+        self.sync_progress = (0, 0)  # (number of config datatypes received, number of config datatypes)
+        self._progress = None
 
         self._destinations = {}
         all_subclasses = self.config.children + self.data.children
@@ -115,58 +126,129 @@ class MCL:
             if data[0:10] == b'MCL-REPLY:':
                 replies.put((ip, json.loads(data[10:])))
 
-    def connect(self, mcl_ip):
+    def connect(self, mcl_ip, timeout=10, wait_sync=True, progress=None):
         """Connect to the MCL system
 
+        The data is received as soon as the sockets are connected, the config
+        variables are synced in the background (see synced and wait_sync)
+
         Parameters
         ----------
         mcl_ip : str
             The IP address of the system
+        timeout : float
+            Time in seconds to open the sockets and, if wait_sync, to sync the config variables
+        wait_sync : bool
+            Return only when the config variables are synced, or after timeout
+        progress : callable
+            Called as progress(received, total) each time a new config datatype is received
 
         Returns
         -------
-        none
+        synced : bool
+            True if the config variables are synced
+
+        Raises
+        ------
+        ConnectionError
+            if the sockets cannot be connected
         """
 
         # Create a TCP/IP socket
         # read data from system, write data to system
         self._sock_read = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._sock_write = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        # event to notify when all variables from the lockin are initilized
-        init_event = threading.Event()
+        self._stop = False
+        self._progress = progress
+        self.synced.clear()
 
         # connect socket to the port
         self._server_address_read = (mcl_ip, 46000)
         self._server_address_write = (mcl_ip, 46001)
-        print('connecting to %s port %s' % self._server_address_read, file=sys.stderr)
         try:
-            self._sock_read.connect(self._server_address_read)
-        except:
-            print("Error: cannot open socket.")
-            time.sleep(1)
-            quit()
-        print('connecting to %s port %s' % self._server_address_write, file=sys.stderr)
-        self._sock_write.connect(self._server_address_write)
+            for sock, address in [(self._sock_read, self._server_address_read),
+                                  (self._sock_write, self._server_address_write)]:
+                print('connecting to %s port %s' % address, file=sys.stderr)
+                sock.settimeout(timeout)
+                sock.connect(address)
+                sock.settimeout(None)
+        except OSError as error:
+            self._sock_read.close()
+            self._sock_write.close()
+            raise ConnectionError("cannot open socket to %s: %s" % (mcl_ip, error))
         # start communication threads
         # reading: send ping to keep read connection
         threading.Thread(target=self._ping_read_timer, daemon=True).start()
         # reading: read data
-        threading.Thread(target=self._data_read, daemon=True, args=[init_event]).start()
+        threading.Thread(target=self._data_read, daemon=True).start()
         # sending: read ping for write connection
         threading.Thread(target=self._ping_write_receive, daemon=True).start()
         # sendimg: send data
         threading.Thread(target=self._data_write, daemon=True).start()
-        # trigger update of user variables
-        time.sleep(1)
-        self.config.general.val = self.config.general.val._replace(updateuser=True)  # This calls send() internally
-        # self._write_queue.put(self.config.general.send())
+        # trigger update of user variables, in the background
+        threading.Thread(target=self._request_config, daemon=True).start()
+
+        if wait_sync:
+            return self.wait_sync(timeout)
+        return self.synced.is_set()
+
+    def connect_async(self, mcl_ip, timeout=10, progress=None):
+        """Connect to the MCL system in a background thread, to connect several
+        systems in parallel
+
+        Parameters
+        ----------
+        mcl_ip : str
+            The IP address of the system
+        timeout : float
+            Time in seconds to open the sockets and to sync the config variables
+        progress : callable
+            Called as progress(received, total) each time a new config datatype is received
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            its result is the one of connect, asyncio.wrap_future makes it awaitable
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.connect(mcl_ip, timeout, True, progress))
+            except Exception as error:
+                future.set_exception(error)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def wait_sync(self, timeout=None):
+        """Wait until all the config variables are received
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time to wait in seconds, None to wait forever
 
-        # wait until all data is received/initialized
+        Returns
+        -------
+        synced : bool
+            False if the timeout expired before the config variables were synced
+        """
+        if self.synced.is_set():
+            return True
         print("Waiting to synchronize config variables...")
-        init_event.wait()
-        print("Connected, config variables synced")
-        init_event.clear()
+        if self.synced.wait(timeout):
+            print("Connected, config variables synced")
+            return True
+        print("Config variables not synced after %s s: %i/%i received" % ((timeout,) + self.sync_progress))
+        return False
+
+    def _request_config(self):
+        """Ask the system to send all the config variables"""
+        time.sleep(1)
+        if not self._stop:
+            self.config.general.val = self.config.general.val._replace(updateuser=True)  # This calls send() internally
+            # self._write_queue.put(self.config.general.send())
 
     def _ping_read_timer(self):
         """Send a ping to the system once a second to keep the connection alive."""
@@ -199,61 +281,75 @@ class MCL:
                 self._sock_write.sendall(to_send)
             self._write_queue.task_done()
 
-    def _data_read(self, init_event):
-        chunks = bytearray()
-        wait_for_header = True
-        min_len = 7
-        datalen = 0
-        datakind = 0
-        datatype = 0  # Controls = 0, Indicators = 1, Config = 2, Lock-in Data = 3, Waveforms = 4
-
-        # check if datatypes are initiated, then notify init_event
+    def _data_read(self):
+        # The data is received in a preallocated buffer: the messages are read
+        # between the read cursor (start) and the end of the received data
+        # (end). The buffer is compacted only when it is full.
+        buffer = bytearray(self.read_buffer_size)
+        view = memoryview(buffer)
+        start = 0
+        end = 0
+        header = struct.Struct('>BHI')  # datatype, datakind, datalen
+        # datatype: Controls = 0, Indicators = 1, Config = 2, Lock-in Data = 3, Waveforms = 4
+
+        # check if datatypes are initiated, then set synced
         num_datatypes = [0, 0, 137, 2, 2]
         initiated_datatypes = [[], [], [False] * num_datatypes[2], [False] * num_datatypes[3],
                                [False] * num_datatypes[4]]
         is_initiated = False
+        self.sync_progress = (0, num_datatypes[2])
 
         while not self._stop:
+            if end == len(buffer):
+                if start > 0:
+                    # move the incomplete message to the front
+                    view[0:end - start] = view[start:end]
+                    end -= start
+                    start = 0
+                else:
+                    # a message larger than the buffer
+                    view.release()
+                    buffer.extend(bytearray(len(buffer)))
+                    view = memoryview(buffer)
             # wating for data
-            chunk = self._sock_read.recv(524288)
-            # received data length = %i" %len(chunk)
-            if chunk == b'':
+            received = self._sock_read.recv_into(view[end:])
+            # received data length = %i" %received
+            if received == 0:
                 raise RuntimeError("socket connection broken")
-            chunks += bytearray(chunk)
-            # wait until full dataset is received
-            while len(chunks) >= min_len:
-                if (wait_for_header):
-                    datatype = int.from_bytes(chunks[0:1], byteorder='big', signed=False)
-                    datakind = int.from_bytes(chunks[1:3], byteorder='big', signed=False)
-                    datalen = int.from_bytes(chunks[3:7], byteorder='big', signed=False)
-                    del chunks[0:7]
-                    min_len = datalen
-                    wait_for_header = False
-                if not wait_for_header and len(chunks) >= min_len:
-                    if not is_initiated:
-                        initiated_datatypes[datatype][datakind] = True
-                        # if initiated_datatypes[2].count(True) + initiated_datatypes[3].count(True) +
-                        # initiated_datatypes[4].count(True) >= sum(num_datatypes):
-                        if initiated_datatypes[2].count(True) >= num_datatypes[2]:
-                            is_initiated = True
-                            init_event.set()
-
-                    data = chunks[0:datalen]
-                    if datatype == 0:
-                        print(data)
-                        time.sleep(1)
-
-#                    if datatype == 2 and (datakind == 6 or datakind == 7):
-#                        print("Receiving", datakind, data, list(data))
-
-
-                    destination = self._get_destination_class(datatype, datakind)
-                    if destination:
-                        destination.receive(data)
-
-                    wait_for_header = True
-                    min_len = 7
-                    del chunks[0:datalen]
+            end += received
+            # handle all the complete messages
+            while end - start >= header.size:
+                datatype, datakind, datalen = header.unpack_from(buffer, start)
+                if end - start - header.size < datalen:
+                    break  # wait until full dataset is received
+                if not is_initiated and not initiated_datatypes[datatype][datakind]:
+                    initiated_datatypes[datatype][datakind] = True
+                    # if initiated_datatypes[2].count(True) + initiated_datatypes[3].count(True) +
+                    # initiated_datatypes[4].count(True) >= sum(num_datatypes):
+                    if datatype == 2:
+                        self.sync_progress = (initiated_datatypes[2].count(True), num_datatypes[2])
+                        if self._progress is not None:
+                            self._progress(*self.sync_progress)
+                    if initiated_datatypes[2].count(True) >= num_datatypes[2]:
+                        is_initiated = True
+                        self.synced.set()
+
+                # own copy of the message, the data classes keep views on it
+                data = bytearray(view[start + header.size:start + header.size + datalen])
+                start += header.size + datalen
+                if datatype == 0:
+                    print(data)
+                    time.sleep(1)
+
+#                if datatype == 2 and (datakind == 6 or datakind == 7):
+#                    print("Receiving", datakind, data, list(data))
+
+
+                destination = self._get_destination_class(datatype, datakind)
+                if destination:
+                    destination.receive(data)
+            if start == end:
+                start = end = 0
 
     def disconnect(self):
         """Disconnect from the MCL system
@@ -1,5 +1,6 @@
 import struct
 from collections import namedtuple
+from resistivity.Device.MCLpy.Dispatcher import Dispatcher
 
 
 __all__ = ['ReadOnlyParameter', 'ReadWriteParameter']
@@ -8,10 +9,9 @@ class ReadOnlyParameter:
     """
     Settings that do not contain any editable setting should inherit from this object.
     """
-    instances = []
+    dispatcher = Dispatcher() # calls the callbacks of all the parameters, in order
 
     def __init__(self, tuple_name, tuple_values, defaults, format_string, data_type, data_kind):
-        self.__class__.instances.append(self)
         self._data_tuple = namedtuple(tuple_name, tuple_values, defaults=defaults)
         self.format_string = format_string
         self.data_type = data_type
@@ -38,6 +38,12 @@ class ReadOnlyParameter:
             raise ValueError(f"Callback with name '{callback}' does not exist.")
         del self._callbacks[callback]
 
+    def _notify_observers(self, *args):
+        """
+        Calls each callback with args and its mcl_instance, from the dispatcher thread
+        """
+        for callback, mcl_instance in self._callbacks.copy().items():
+            self.dispatcher.dispatch(callback, args + (mcl_instance,))
 
     @property
     def val(self):
@@ -48,7 +54,6 @@ class ReadWriteParameter(ReadOnlyParameter):
     """
 
     """
-    instances = []
 
     def __init__(self, my_queue, tuple_name, tuple_values, defaults, format_string, data_type, data_kind):
         super().__init__(tuple_name, tuple_values, defaults, format_string, data_type, data_kind)
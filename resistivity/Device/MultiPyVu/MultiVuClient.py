@@ -14,11 +14,12 @@ with MultiVu.
 """
 
 from sys import exc_info
+import json
 from enum import IntEnum
 import time
 from threading import Thread, Lock
 import traceback
-from typing import Union, Tuple
+from typing import Callable, Dict, List, Union, Tuple
 
 from .MultiVuClient_base import ClientBase
 from .instrument import InstrumentList
@@ -58,6 +59,9 @@ class Client(ClientBase):
         The time in seconds that the client will wait to try
         and connect to the server.  Value of None will wait
         indefinitely.  Default is 2.5 sec.
+    binary: bool (optional)
+        Use the compact binary messages if the server supports them,
+        else JSON.  Default is True.
     '''
     class TemperatureAdapter():
         def __init__(self):
@@ -91,8 +95,9 @@ class Client(ClientBase):
                  host: str = HOST,
                  port: int = PORT,
                  socket_timeout: Union[float, None] = 2.5,
+                 binary: bool = True,
                  ):
-        super().__init__(host, port, socket_timeout)
+        super().__init__(host, port, socket_timeout, binary)
         self.resistivity = Brt(self)
         '''
         The resistivity option provides capabilities to measure
@@ -114,6 +119,10 @@ class Client(ClientBase):
         self._set_pointH = 0.0
         self._set_chamb = self.chamber.mode.seal
 
+        # SDO queries of the subscription, see subscribe()
+        self._subscribed = False
+        self._subscribed_sdos = []
+
     ###########################
     #  Command Methods
     ###########################
@@ -182,6 +191,9 @@ class Client(ClientBase):
 
         '''
         response = self.query_server('TEMP?', '')
+        return self._convert_temperature(response)
+
+    def _convert_temperature(self, response: Dict[str, str]) -> Tuple[float, str]:
         try:
             temperature = Command_factory.create_command_temp()
             temperature, status = temperature.convert_result(response)
@@ -252,11 +264,52 @@ class Client(ClientBase):
         temperature, status = self.get_sdo(sdo)
         return float(temperature), status
 
+    def __wait_for_pushed_status(self,
+                                 quantity: str,
+                                 condition: Callable[[str], bool],
+                                 timeout_sec: float) -> bool:
+        '''
+        This private method waits until the status of a quantity pushed by
+        the server after subscribe satisfies a condition, without querying
+        the server.
+
+        Parameters
+        ----------
+        quantity : str
+            'temperature' or 'field'.
+        condition : function
+            Called with the status, returning True when the wait is over.
+        timeout_sec : float
+            The maximum time to wait, in seconds.  0 waits forever.
+
+        Returns
+        -------
+        bool
+            False if the wait timed out or the main thread has killed
+            the monitoring.
+
+        '''
+        start = time.time()
+        while self._thread_running:
+            # wake up every second to check if the monitoring was killed
+            wait_time = 1.0
+            if timeout_sec > 0:
+                wait_time = min(wait_time,
+                                timeout_sec - (time.time() - start))
+                if wait_time <= 0:
+                    return False
+            if self.wait_for_state(
+                    lambda states: condition(states[quantity][1]),
+                    wait_time):
+                return True
+        return False
+
     def __monitor_temp_stability(self, timeout_sec, mutex):
         '''
         This private method is used to monitor the temperature. It waits for
         the status to become not 'stable,' and then waits again for the status
-        to become 'stable.'
+        to become 'stable.'  After subscribe, it uses the pushed states
+        instead of querying the temperature.
 
         Parameters
         ----------
@@ -272,10 +325,26 @@ class Client(ClientBase):
 
         '''
         start = time.time()
+        max_time_to_start = 5.0
+        if self._subscribed:
+            if timeout_sec > 0:
+                max_time_to_start = min(max_time_to_start, timeout_sec)
+            self.__wait_for_pushed_status('temperature',
+                                          lambda status: status != 'Stable',
+                                          max_time_to_start)
+            remaining = 0
+            if timeout_sec > 0:
+                remaining = timeout_sec - (time.time() - start)
+                if remaining <= 0:
+                    return
+            self.__wait_for_pushed_status('temperature',
+                                          lambda status: status == 'Stable',
+                                          remaining)
+            return
+
         mutex.acquire()
         t, status = self.get_temperature()
         mutex.release()
-        max_time_to_start = 5.0
         while status == 'Stable':
             time.sleep(0.3)
             mutex.acquire()
@@ -313,6 +382,9 @@ class Client(ClientBase):
 
         '''
         response = self.query_server('FIELD?', '')
+        return self._convert_field(response)
+
+    def _convert_field(self, response: Dict[str, str]) -> Tuple[float, str]:
         try:
             field = Command_factory.create_command_field()
             field, status = field.convert_result(response)
@@ -377,7 +449,8 @@ class Client(ClientBase):
         '''
         This private method is used to monitor the magnetic field. It waits for
         the status to start with 'Holding,' and then waits again for the status
-        to not start with 'Holding.'
+        to not start with 'Holding.'  After subscribe, it uses the pushed
+        states instead of querying the field.
 
         Parameters
         ----------
@@ -393,10 +466,29 @@ class Client(ClientBase):
 
         '''
         start = time.time()
+        max_time_to_start = 5.0
+        if self._subscribed:
+            if timeout_sec > 0:
+                max_time_to_start = min(max_time_to_start, timeout_sec)
+            if not self.__wait_for_pushed_status(
+                    'field',
+                    lambda status: not status.startswith('Holding'),
+                    max_time_to_start):
+                return
+            remaining = 0
+            if timeout_sec > 0:
+                remaining = timeout_sec - (time.time() - start)
+                if remaining <= 0:
+                    return
+            self.__wait_for_pushed_status(
+                'field',
+                lambda status: status.startswith('Holding'),
+                remaining)
+            return
+
         mutex.acquire()
         f, status = self.get_field()
         mutex.release()
-        max_time_to_start = 5.0
         while status.startswith('Holding'):
             time.sleep(0.3)
             mutex.acquire()
@@ -435,6 +527,9 @@ class Client(ClientBase):
 
         '''
         response = self.query_server('CHAMBER?', '')
+        return self._convert_chamber(response)
+
+    def _convert_chamber(self, response: Dict[str, str]) -> str:
         chamber = Command_factory.create_command_chamber()
         try:
             status = chamber.convert_result(response)
@@ -445,6 +540,166 @@ class Client(ClientBase):
             status = (0, e.value)
         return status[1]
 
+    def get_states(self, chamber: bool = True) -> Dict[str, Union[Tuple[float, str], str]]:
+        '''
+        This gets the temperature, the field and the chamber status with
+        pipelined requests, in one round-trip to the server.
+
+        Parameters
+        ----------
+        chamber : bool, optional
+            Set to False to skip the chamber status.  The default is True.
+
+        Returns
+        -------
+        dict
+            With keys 'temperature' and 'field', giving tuples of
+            (value, status), and 'chamber', giving the chamber status.
+
+        '''
+        requests = [('TEMP?', ''), ('FIELD?', '')]
+        if chamber:
+            requests.append(('CHAMBER?', ''))
+        responses = self.query_server_pipelined(requests)
+        states = {'temperature': self._convert_temperature(responses[0]),
+                  'field': self._convert_field(responses[1])}
+        if chamber:
+            states['chamber'] = self._convert_chamber(responses[2])
+        return states
+
+    def get_state_snapshot(self, sdos: List[SdoObject] = []) -> Dict:
+        '''
+        This gets the temperature, the field, the chamber status and the
+        values of a list of SDOs with one command, which the server answers
+        in one message.
+
+        Parameters
+        ----------
+        sdos : [SdoObject], optional
+            The SDOs to read.  The default is [].
+
+        Returns
+        -------
+        dict
+            With keys 'temperature' and 'field', giving tuples of
+            (value, status), 'chamber', giving the chamber status, and
+            'sdos', giving a list of tuples of (value, status) in the
+            order of sdos.
+
+        '''
+        sdo_queries = [str(sdo) for sdo in sdos]
+        response = self.query_server('STATE?', ';'.join(sdo_queries))
+        return self._convert_snapshot(json.loads(response['result']),
+                                      sdo_queries)
+
+    def _convert_snapshot(self,
+                          snapshot: Dict[str, str],
+                          sdo_queries: List[str]) -> Dict:
+        def result(action, query=''):
+            command = f'{action} {query}' if query else action
+            return {'action': action, 'query': query, 'result': snapshot[command]}
+
+        can_sdo = Command_factory.create_command_sdo()
+        sdo_values = []
+        for query in sdo_queries:
+            try:
+                sdo_values.append(can_sdo.convert_result(result('SDO?', query)))
+            except MultiPyVuError as e:
+                sdo_values.append((0, e.value))
+        return {'temperature': self._convert_temperature(result('TEMP?')),
+                'field': self._convert_field(result('FIELD?')),
+                'chamber': self._convert_chamber(result('CHAMBER?')),
+                'sdos': sdo_values}
+
+    def subscribe(self, period: float = 1.0, sdos: List[SdoObject] = []):
+        '''
+        This asks the server to read the temperature, the field, the
+        chamber status and the SDOs every period and to send the states
+        which changed.  The last states received are given by
+        get_pushed_state, and wait_for_state waits for a condition on them
+        without querying the server.
+
+        Parameters
+        ----------
+        period : float, optional
+            The time between two readings, in seconds.  The default is 1.0.
+        sdos : [SdoObject], optional
+            The SDOs to read.  The default is [].
+
+        '''
+        self._subscribed_sdos = [str(sdo) for sdo in sdos]
+        query = ';'.join([str(period)] + self._subscribed_sdos)
+        response = self.query_server('SUBSCRIBE', query)
+        if response['result'].startswith('MultiPyVuError'):
+            raise MultiPyVuError(response['result'])
+        # previous states are not kept
+        self._message.pushed_states = {}
+        self._subscribed = True
+
+    def unsubscribe(self):
+        '''
+        This stops the readings started by subscribe.
+        '''
+        self.query_server('UNSUBSCRIBE', '')
+        self._subscribed = False
+
+    def get_pushed_state(self, timeout: float = 0) -> Union[Dict, None]:
+        '''
+        This gives the last states pushed by the server after subscribe.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait for new states, in seconds.  The
+            default is 0, which returns the states already received.
+
+        Returns
+        -------
+        dict
+            As get_state_snapshot, or None if no states were received yet.
+
+        '''
+        self.read_pushed_events(timeout)
+        with self._message.pushed_condition:
+            states = dict(self._message.pushed_states)
+        if not states:
+            return None
+        return self._convert_snapshot(states, self._subscribed_sdos)
+
+    def wait_for_state(self,
+                       condition: Callable[[Dict], bool],
+                       timeout: float = 0) -> bool:
+        '''
+        This waits until the states pushed by the server satisfy a
+        condition.  The socket is only read when no other thread uses it,
+        and the events read by the other threads wake this one up, so
+        other threads can still query the server meanwhile.
+
+        Parameters
+        ----------
+        condition : function
+            Called with the states, as given by get_pushed_state, and
+            returning True when the wait is over.
+        timeout : float, optional
+            The maximum time to wait, in seconds.  The default is 0, which
+            waits forever.
+
+        Returns
+        -------
+        bool
+            False if the wait timed out.
+
+        '''
+        start = time.monotonic()
+        while True:
+            states = self.get_pushed_state()
+            if states is not None and condition(states):
+                return True
+            remaining = timeout - (time.monotonic() - start)
+            if timeout and remaining <= 0:
+                return False
+            self.read_pushed_events(remaining if timeout else 1.0)
+
     def set_chamber(self, mode: IntEnum):
         '''
         This sets the chamber status.
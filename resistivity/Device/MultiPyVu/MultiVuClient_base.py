@@ -15,9 +15,11 @@ MultiVuClient class has specific commands to be used with this class.
 import sys
 import os
 import socket
+import select
+import threading
 import traceback
 import time
-from typing import Dict, Union
+from typing import Dict, List, Tuple, Union
 
 
 from .SocketMessageClient import ClientMessage
@@ -55,15 +57,20 @@ class ClientBase():
         The time in seconds that the client will wait to try
         and connect to the server.  Value of None will wait
         indefinitely.  Default is 2.5 sec.
+    binary: bool (optional)
+        Use the compact binary messages if the server supports them,
+        else JSON.  Default is True.
     '''
 
     def __init__(self,
                  host: str = HOST,
                  port: int = PORT,
                  socket_timeout: Union[float, None] = 2.5,
+                 binary: bool = True,
                  ):
         self._addr = (host, port)
         self._socket_timeout = socket_timeout
+        self._binary = binary
         self._message = None     # ClientMessage object
         self._sock = None
         self._request = {}
@@ -71,6 +78,8 @@ class ClientBase():
         self.log_event = log(CLIENT_NAME)
         self._instr = None
         self.instrument_name = ''
+        # one thread at a time uses the socket
+        self._socket_lock = threading.RLock()
 
     def __enter__(self):
         # Configure logging
@@ -80,12 +89,16 @@ class ClientBase():
         self.logger.info(f'Starting connection to {self._addr}')
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._sock.setblocking(False)
+        # send the small requests right away, pipelined requests
+        # would otherwise wait for the acknowledgement of the previous ones
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self._sock.connect_ex(self._addr)
 
         self._message = ClientMessage(self._sock)
         # send a request to the sever to confirm a connection
         action = 'START'
-        response = self.query_server(action)
+        # ask for the binary messages, a server without them ignores it
+        response = self.query_server(action, 'b' if self._binary else '')
         self.logger.info(response['result'])
         self._instr = self._message.instr
         self.instrument_name = self._message.instr.name
@@ -238,18 +251,19 @@ class ClientBase():
             msg += 'No connection to the server.  Is the client connected?'
             raise ClientCloseError(msg)
         timeout_attempts = 0
-        while True:
-            self._message.create_request(action, query)
-            try:
-                response = self.__monitor_and_get_response()
-                break
-            except TimeoutError:
-                if timeout_attempts >= MAX_TRIES:
-                    # An empty list means the selector timed out
-                    msg = 'Socket timed out after '
-                    msg += f'{timeout_attempts} attempts.'
-                    raise TimeoutError(msg)
-                timeout_attempts += 1
+        with self._socket_lock:
+            while True:
+                self._message.create_request(action, query)
+                try:
+                    response = self.__monitor_and_get_response()
+                    break
+                except TimeoutError:
+                    if timeout_attempts >= MAX_TRIES:
+                        # An empty list means the selector timed out
+                        msg = 'Socket timed out after '
+                        msg += f'{timeout_attempts} attempts.'
+                        raise TimeoutError(msg)
+                    timeout_attempts += 1
         if response == {}:
             msg = 'No return value, which could mean that MultiVu '
             msg += 'is not running or that the connection has '
@@ -315,6 +329,113 @@ class ClientBase():
                 break
         return resp
 
+    def query_server_pipelined(self,
+                               requests: List[Tuple[str, str]]
+                               ) -> List[Dict[str, str]]:
+        '''
+        Sends several requests at once and waits for all the responses, so
+        that the requests share one round-trip to the server.  Each request
+        has an id, and the responses are matched with the requests by their
+        id, whatever their order.
+
+        Parameters
+        ----------
+        requests : [(str, str)]
+            The list of (action, query) to send, for example
+            [('TEMP?', ''), ('FIELD?', '')].
+
+        Returns
+        -------
+        The list of the response dictionaries, in the order of the requests.
+
+        Raises:
+        -------
+        ClientCloseError
+        TimeoutError
+        MultiPyVuError
+        '''
+        if self._message is None:
+            msg = 'Error:  '
+            msg += 'No connection to the server.  Is the client connected?'
+            raise ClientCloseError(msg)
+        with self._socket_lock:
+            ids = self._message.queue_pipelined_requests(requests)
+            responses = {}
+            while len(responses) < len(ids):
+                events = self._message.get_events(self._socket_timeout)
+                if not events:
+                    msg = f'Socket timed out after {self._socket_timeout} sec '
+                    msg += f'with {len(ids) - len(responses)} pending requests.'
+                    raise TimeoutError(msg)
+                for key, mask in events:
+                    message: ClientMessage = key.data
+                    if message.is_write(mask):
+                        message._write()
+                        if not message._send_buffer:
+                            message._set_selector_events_mask('r')
+                    if message.is_read(mask):
+                        message._read()
+                        responses.update(message.process_pipelined_responses())
+                self.__check_windows_esc()
+        results = []
+        for request_id in ids:
+            response = responses[request_id]
+            if response['result'].startswith('MultiPyVuError: '):
+                raise MultiPyVuError(response['result'])
+            results.append(response)
+        return results
+
+    def read_pushed_events(self, timeout: float = 0) -> int:
+        '''
+        Reads the events pushed by the server to a subscribed client (see
+        Client.subscribe), waiting for them at most timeout seconds.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait for an event, in seconds.  The
+            default is 0, which only reads the events already received.
+
+        Returns
+        -------
+        The number of events received so far.
+        '''
+        if self._message is None:
+            msg = 'Error:  '
+            msg += 'No connection to the server.  Is the client connected?'
+            raise ClientCloseError(msg)
+        message = self._message
+        with message.pushed_condition:
+            count = message.pushed_count
+        deadline = time.monotonic() + timeout
+        while True:
+            # Wait for data without the socket lock, so that the other
+            # threads can query the server meanwhile
+            wait = min(max(deadline - time.monotonic(), 0), 0.1)
+            readable, _, _ = select.select([message.sock], [], [], wait)
+            socket_busy = False
+            if readable and not self._socket_lock.acquire(blocking=False):
+                socket_busy = True
+            elif readable:
+                try:
+                    # the socket is only read: no request is waiting for
+                    # a response
+                    message._set_selector_events_mask('r')
+                    if message.get_events(0):
+                        message._read()
+                        message.process_pipelined_responses()
+                finally:
+                    self._socket_lock.release()
+            with message.pushed_condition:
+                if socket_busy and message.pushed_count == count:
+                    # Another thread is reading the socket, it stores the
+                    # events and notifies them
+                    message.pushed_condition.wait(
+                        max(min(deadline - time.monotonic(), 0.1), 0))
+                if message.pushed_count > count \
+                        or time.monotonic() >= deadline:
+                    return message.pushed_count
+
     def __monitor_and_get_response(self) -> Dict[str, str]:
         '''
         This monitors the traffic going on.  It asks the SocketMessageClient
@@ -374,6 +495,9 @@ class ClientBase():
                         if message.is_write(mask):
                             self._request = message.request['content']
                         elif message.is_read(mask):
+                            if not message.response_received:
+                                # partial response, or pushed events only
+                                continue
                             self._response = message.response
                             # check response answers a request
                             if self._request['action'] != self._response['action']:
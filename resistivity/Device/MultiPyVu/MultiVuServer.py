@@ -68,7 +68,8 @@ class Server(Subject):
                  flags: List[str] = [],
                  host: str = HOST,
                  port: int = PORT,
-                 keep_server_open=False
+                 keep_server_open=False,
+                 cache_age: float = 0.1,
                  ):
         '''
         This class is used to start and maintain a socket server.  A client
@@ -108,6 +109,12 @@ class Server(Subject):
             script.  When True, the script will stay in the .open() method
             as long as the server is running.
             Default is False.
+        cache_age : float, optional
+            Several clients can be connected at once.  The states read
+            from MultiVu are given to all the clients for cache_age
+            seconds, so that clients reading the same states at the same
+            time only call MultiVu once.  Set to 0 to always call MultiVu.
+            Default is 0.1.
 
         '''
         # instantiate the base class
@@ -119,7 +126,8 @@ class Server(Subject):
         self.server_thread = threading.Thread()
 
         self.lsock = None       # the initial listening sock
-        self.message = None     # ServerMessage object
+        self.message = None     # ServerMessage of the last client connected
+        self.clients: List[ServerMessage] = []  # all the connected clients
         # Parsing the flags looks for user
         try:
             flag_info = self._parse_input_flags(flags)
@@ -152,6 +160,7 @@ class Server(Subject):
         except MultiPyVuError:
             self.close()
             sys.exit(0)
+        self.instr.cache_age = cache_age
 
         self.notify()
 
@@ -217,16 +226,14 @@ class Server(Subject):
             try:
                 self._monitor_socket_connection(sel)
             except KeyboardInterrupt:
-                if self.message is not None:
-                    self.message.shutdown()
-                    self.message = None
+                self._close_clients()
                 self.close()
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback) -> bool:
         if self.message is not None:
             self.instr.end_multivu_win32com_instance()
-            self.message.shutdown()
+        self._close_clients()
         if self.lsock is not None:
             if self.lsock.fileno() > 0:
                 try:
@@ -340,6 +347,8 @@ class Server(Subject):
             raise ValueError(msg)
         accepted_sock, self._addr = sock.accept()
         accepted_sock.setblocking(False)
+        # send the small responses right away, see MultiVuClient_base
+        accepted_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.logger.info(f'Accepted connection from {self._addr}')
 
         message = ServerMessage(sel,
@@ -370,7 +379,12 @@ class Server(Subject):
         This monitors traffic and looks for new clients and new requests.  For
         new clients, it calls ._accept_wrapper.  After that, it takes the
         socket and asks the SocketMessageServer for help in figuring out what
-        to do.
+        to do.  The requests of all the clients are answered in this thread,
+        in the order they are received, so the MultiVu calls are never made
+        at the same time.  MultiVu answers one call at a time anyway, and the
+        COM object is bound to the thread which opened it: a slow call delays
+        the other clients, but the states they read in the last cache_age
+        seconds are shared (see Instrument.cache_age).
 
         Parameters:
         -----------
@@ -391,13 +405,25 @@ class Server(Subject):
             self._update_connection_status(False)
             return
 
-        while True:
-            if self.message is not None \
-                    and not self.is_client_connected():
-                return
+        while self.lsock is not None:
             self._check_windows_esc()
+            # wake up for the next state reading of a subscribed client
+            timeout = TIMEOUT_LENGTH
+            for message in list(self.clients):
+                try:
+                    next_push = message.push_events()
+                except pywin_com_error as e:
+                    # the states are read again at the next period
+                    self.logger.info(str(PwinComError(e)))
+                    continue
+                except MultiPyVuError as e:
+                    self.logger.info(e)
+                    continue
+                if next_push is not None:
+                    timeout = min(timeout,
+                                  max(next_push - time.monotonic(), 0))
             try:
-                events = selectors.select(timeout=TIMEOUT_LENGTH)
+                events = selectors.select(timeout=timeout)
             except OSError:
                 # This error happens if the selectors is unavailable.
                 continue
@@ -410,45 +436,34 @@ class Server(Subject):
                                                        selector_sock)
                     except BlockingIOError:
                         # try calling this method again
-                        time.sleep(0.5)
                         continue
                     except MultiPyVuError as e:
                         self.logger.info(e)
                         return
                     else:
+                        self.clients.append(message)
                         self.message = message
                         self.notify()
-                        # pause to allow for the connection
-                        time.sleep(0.5)
+                        # the request is read when it arrives
+                        continue
                 # initial_connect = message.connected
                 initial_connect = message.connection_good()
                 try:
                     message.process_events(mask)
                 except ServerCloseError:
-                    content = message.request['content']
-                    query = content.get('query', 'CLOSE')
-                    if query == 'CLOSE':
-                        [new_events] = message.get_events(TIMEOUT_LENGTH)
-                        new_sock = new_events[0].fileobj
-                        try:
-                            self._accept_wrapper(selectors, new_sock)
-                        except MultiPyVuError as e:
-                            self.logger.info(e)
-                            return
-                        self.notify()
-                        continue
-                    else:
-                        self._update_connection_status(False)
+                    # EXIT from one client closes the server
+                    self._update_connection_status(False)
                     return
                 except ClientCloseError as e:
+                    # The other clients are still served
                     self.logger.info(e)
-                    self._update_connection_status(False)
-                    return
+                    self._remove_client(message)
+                    continue
                 except AttributeError as e:
                     msg = 'Lost connection to socket.'
                     self.logger.info(f'{msg}:   {e}')
-                    self._update_connection_status(False)
-                    return
+                    self._remove_client(message)
+                    continue
                 except pywin_com_error as e:
                     self.logger.info(str(PwinComError(e)))
                     self._update_connection_status(False)
@@ -466,6 +481,33 @@ class Server(Subject):
                 if not self.server_thread.is_alive():
                     return
 
+    def _remove_client(self, message: ServerMessage):
+        '''
+        Closes the connection to a client and logs its latency statistics.
+        '''
+        message.shutdown()
+        if message in self.clients:
+            self.clients.remove(message)
+            stats = message.latency_stats()
+            msg = f'Client {stats["address"]}: {stats["requests"]} requests, '
+            msg += f'latency mean {stats["mean_ms"]:.2f} ms, '
+            msg += f'min {stats["min_ms"]:.2f} ms, '
+            msg += f'max {stats["max_ms"]:.2f} ms'
+            self.logger.info(msg)
+        if self.message is message:
+            self.message = self.clients[-1] if self.clients else None
+        self.notify()
+
+    def _close_clients(self):
+        '''
+        Closes the connections to all the clients.
+        '''
+        for message in list(self.clients):
+            self._remove_client(message)
+        if self.message is not None:
+            self.message.shutdown()
+            self.message = None
+
     def open(self):
         '''
         This method is the entry point to the MultiVuServer class.  It starts
@@ -496,10 +538,9 @@ class Server(Subject):
 
     def is_client_connected(self) -> bool:
         with threading.Lock():
-            status = False
-            if self.message is not None:
-                # status = self.message.connected
-                status = self.message.connection_good()
+            # status = self.message.connected
+            status = any(message.connection_good()
+                         for message in list(self.clients))
             return status
 
     def client_address(self):
@@ -509,6 +550,20 @@ class Server(Subject):
             address = ('', 0)
         return address
 
+    def client_stats(self) -> List[Dict[str, Union[float, int, str]]]:
+        '''
+        The latency statistics of the connected clients.
+
+        Returns
+        -------
+        list
+            One dictionary per client, see ServerMessage.latency_stats().
+            The number of MultiVu calls and of states read from the cache,
+            shared by the clients, are in self.instr.com_calls and
+            self.instr.cache_hits.
+        '''
+        return [message.latency_stats() for message in list(self.clients)]
+
 
 def server(flags: str = ''):
     '''
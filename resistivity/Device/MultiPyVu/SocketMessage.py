@@ -24,6 +24,17 @@ from .exceptions import (ClientCloseError,
                          )
 
 
+# Binary messages start with a header length of 0, which a JSON header
+# cannot have, followed by the length of the content:
+#   > = big-endian, H = 2 bytes (0), I = 4 bytes (content length)
+_binary_prefix = struct.Struct('>HI')
+# The content is the id flag and value, the lengths of the action, query
+# and result, followed by their utf-8 bytes:
+#   B = 1 byte (1 if the id is set), I = 4 bytes (id),
+#   H = 2 bytes (action), I = 4 bytes (query), I = 4 bytes (result)
+_binary_content = struct.Struct('>BIHII')
+
+
 class Message:
     def __init__(self, sock: socket.socket):
         '''
@@ -51,6 +62,17 @@ class Message:
 
         The entry method into the class is process_events(mask).
 
+        Pipelined requests add an 'id' key to the content dictionary.  The
+        server copies it into the response, so that several requests can
+        be sent before reading the responses, which are matched by their id.
+
+        When both ends support it (see .binary), the content is instead
+        sent in a compact binary form:
+            Header length of 0
+            Content length in bytes
+            Content packed with struct (see _binary_content)
+        Both forms are always accepted when receiving.
+
         The class also has methods for read(), write(), and close().
 
         Note that the server should set the following attributes:
@@ -78,6 +100,8 @@ class Message:
         self._sent_success = False       # only used by the server
         self.response: dict = {}         # only used by the client
         self.mvu_flavor = None
+        # send the binary form, negotiated by the START request
+        self.binary = False
         self.verbose = False
         self.scaffolding = False
         self.server_threading = False
@@ -96,6 +120,8 @@ class Message:
             query_list.append('s')
         if self.server_threading:
             query_list.append('t')
+        if self.binary:
+            query_list.append('b')
         return ';'.join(query_list)
 
     def _str_to_start_options(self, server_options: str) -> Dict:
@@ -104,6 +130,7 @@ class Message:
         options_dict['verbose'] = 'v' in options_list
         options_dict['scaffolding'] = 's' in options_list
         options_dict['threading'] = 't' in options_list
+        options_dict['binary'] = 'b' in options_list
         return options_dict
 
     def _set_selector_events_mask(self, mode):
@@ -163,13 +190,19 @@ class Message:
                 self._sent_success = True
                 self._send_buffer = self._send_buffer[sent:]
 
-    def _log_received_result(self, message: str):
-        msg = f';from {self.addr}; Received request {message}'
-        self.log_message(msg)
+    def _log_enabled(self) -> bool:
+        # the messages are only formatted when they are logged
+        return self.verbose or self.logger.isEnabledFor(logging.DEBUG)
+
+    def _log_received_result(self, content: Dict):
+        if self._log_enabled():
+            msg = f';from {self.addr}; Received request {repr(content)}'
+            self.log_message(msg)
 
     def _log_send(self):
-        msg = f';to {self.addr}; Sending {repr(self._send_buffer)}'
-        self.log_message(msg)
+        if self._log_enabled():
+            msg = f';to {self.addr}; Sending {repr(self._send_buffer)}'
+            self.log_message(msg)
 
     def _check_exit(self):
         '''
@@ -208,6 +241,47 @@ class Message:
         tiow.close()
         return obj
 
+    def _binary_encode(self, content: Dict) -> bytes:
+        action = content['action'].encode('utf-8')
+        query = str(content['query']).encode('utf-8')
+        result = str(content['result']).encode('utf-8')
+        has_id = 'id' in content
+        content_bytes = _binary_content.pack(has_id,
+                                             content['id'] if has_id else 0,
+                                             len(action),
+                                             len(query),
+                                             len(result))
+        content_bytes += action + query + result
+        return _binary_prefix.pack(0, len(content_bytes)) + content_bytes
+
+    def _binary_decode(self, content_bytes: bytes) -> Dict:
+        has_id, request_id, action_len, query_len, result_len = \
+            _binary_content.unpack_from(content_bytes)
+        start = _binary_content.size
+        end = start + action_len
+        content = {'action': content_bytes[start:end].decode('utf-8')}
+        start, end = end, end + query_len
+        content['query'] = content_bytes[start:end].decode('utf-8')
+        start, end = end, end + result_len
+        content['result'] = content_bytes[start:end].decode('utf-8')
+        if has_id:
+            content['id'] = request_id
+        return content
+
+    def _encode_content(self, content: Dict) -> bytes:
+        '''
+        Creates the message of a content dictionary, in the binary form if
+        it was negotiated, or else as JSON.
+        '''
+        if self.binary:
+            return self._binary_encode(content)
+        content_encoding = 'utf-8'
+        return self._create_message(
+            content_bytes=self._json_encode(content, content_encoding),
+            content_type='text/json',
+            content_encoding=content_encoding,
+            )
+
     def _create_message(self,
                         *,
                         content_bytes,
@@ -304,7 +378,7 @@ class Message:
         monitoring. A file object shall be unregistered prior to
         being closed.
         '''
-        if not self.connection_good():
+        if self.connection_good():
             return self.selector.unregister(self.sock)
 
     def process_events(self, mask):
@@ -394,10 +468,53 @@ class Message:
             self._jsonheader_len = struct.unpack(
                 '>H',
                 self._recv_buffer[:hdrlen])[0]
-            if len(self._recv_buffer) > self._jsonheader_len:
-                # Now that we know how big the header is, we can trim
-                # the buffer and remove the header length info
-                self._recv_buffer = self._recv_buffer[hdrlen:]
+            # Now that we know how big the header is, we can trim
+            # the buffer and remove the header length info.  This must
+            # happen together, or a partial header would be read from
+            # the header length bytes.
+            self._recv_buffer = self._recv_buffer[hdrlen:]
+
+    def pop_message(self) -> Union[Dict, None]:
+        '''
+        Removes the first complete message from the receive buffer, without
+        changing the state used by read().  This is used for pipelined
+        messages, when the buffer can hold several of them.
+
+        Returns
+        -------
+        The content dictionary of the message, or None if the buffer
+        does not hold a complete message.
+        '''
+        hdrlen = 2
+        if len(self._recv_buffer) < hdrlen:
+            return None
+        jsonheader_len = struct.unpack('>H', self._recv_buffer[:hdrlen])[0]
+        if jsonheader_len == 0:
+            # binary message
+            if len(self._recv_buffer) < _binary_prefix.size:
+                return None
+            _, content_len = _binary_prefix.unpack_from(self._recv_buffer)
+            content_end = _binary_prefix.size + content_len
+            if len(self._recv_buffer) < content_end:
+                return None
+            content = self._binary_decode(
+                self._recv_buffer[_binary_prefix.size:content_end])
+            self._recv_buffer = self._recv_buffer[content_end:]
+            return content
+        content_start = hdrlen + jsonheader_len
+        if len(self._recv_buffer) < content_start:
+            return None
+        jsonheader = self._json_decode(
+            self._recv_buffer[hdrlen:content_start],
+            'utf-8')
+        content_end = content_start + jsonheader['content-length']
+        if len(self._recv_buffer) < content_end:
+            return None
+        content = self._json_decode(
+            self._recv_buffer[content_start:content_end],
+            jsonheader['content-encoding'])
+        self._recv_buffer = self._recv_buffer[content_end:]
+        return content
 
     def process_jsonheader(self):
         hdrlen = self._jsonheader_len
@@ -9,8 +9,11 @@ Created on Mon Jun 7 23:47:19 2021
 """
 
 import re
+import json
 import logging
+import threading
 import time
+from typing import Dict, List, Tuple
 
 from .SocketMessage import Message
 from .instrument import Instrument
@@ -23,6 +26,13 @@ class ClientMessage(Message):
         super().__init__(sock)
         time.sleep(0.3)
         self.logger = logging.getLogger(CLIENT_NAME)
+        self._request_id = 0    # id of the last pipelined request
+        self.response_received = False   # a response was read by read()
+        # states pushed by the server, see MultiVuServer subscriptions
+        self.pushed_states = {}
+        self.pushed_count = 0
+        # notified for each event, by the thread which read it
+        self.pushed_condition = threading.Condition()
 
     #########################################
     #
@@ -37,6 +47,8 @@ class ClientMessage(Message):
             self.verbose = options_dict['verbose']
             self.scaffolding = options_dict['scaffolding']
             self.server_threading = options_dict['threading']
+            # the server answers 'b' if it also uses the binary messages
+            self.binary = options_dict['binary']
             resp = content.get('result')
             search = r'Connected to ([\w]*) MultiVuServer'
             self.mvu_flavor = re.findall(search, resp)[0]
@@ -100,15 +112,18 @@ class ClientMessage(Message):
             self.shutdown()
             raise ClientCloseError(e.args[0]) from e
 
-        if self._jsonheader_len == 0:
-            self.process_protoheader()
-
-        if self._jsonheader_len > 0:
-            if self.jsonheader == {}:
-                self.process_jsonheader()
-
-        if self.jsonheader:
-            self.process_response()
+        # The buffer can hold events pushed by the server before the
+        # response, they are stored and the response is still awaited
+        self.response_received = False
+        while not self.response_received:
+            content = self.pop_message()
+            if content is None:
+                return
+            if not self.process_event(content):
+                self.response = content
+                self._log_received_result(self.response)
+                self._process_response_json_content()
+                self.response_received = True
 
         self._set_selector_events_mask('w')
         self._check_close()
@@ -132,18 +147,7 @@ class ClientMessage(Message):
                 self._request_queued = False
 
     def queue_request(self):
-        content = self.request['content']
-        content_type = self.request['type']
-        content_encoding = self.request['encoding']
-        content_binary = self._json_encode(content, content_encoding)
-
-        req = {
-            'content_bytes': content_binary,
-            'content_type': content_type,
-            'content_encoding': content_encoding,
-            }
-        message = self._create_message(**req)
-        self._send_buffer += message
+        self._send_buffer += self._encode_content(self.request['content'])
         self._request_queued = True
 
     def process_response(self):
@@ -155,5 +159,64 @@ class ClientMessage(Message):
         self._recv_buffer = self._recv_buffer[content_len:]
         encoding = self.jsonheader["content-encoding"]
         self.response = self._json_decode(data, encoding)
-        self._log_received_result(repr(self.response))
+        self._log_received_result(self.response)
         self._process_response_json_content()
+
+    def queue_pipelined_requests(self, requests: List[Tuple[str, str]]) -> List[int]:
+        '''
+        Queue several requests at once, each with its own id, so that they
+        share one round-trip to the server.
+
+        Parameters
+        ----------
+        requests : [(str, str)]
+            The list of (action, query) to send.
+
+        Returns
+        -------
+        The list of the ids of the requests.
+        '''
+        ids = []
+        for action, query in requests:
+            self._request_id += 1
+            content = dict(action=action.upper(),
+                           query=query,
+                           result='',
+                           id=self._request_id)
+            self._send_buffer += self._encode_content(content)
+            ids.append(self._request_id)
+        self._set_selector_events_mask('rw')
+        return ids
+
+    def process_pipelined_responses(self) -> Dict[int, Dict]:
+        '''
+        Read the complete responses of the receive buffer.
+
+        Returns
+        -------
+        A dictionary of the responses, with their id as key.
+        '''
+        responses = {}
+        while True:
+            content = self.pop_message()
+            if content is None:
+                return responses
+            if not self.process_event(content):
+                self._log_received_result(content)
+                responses[content.get('id')] = content
+
+    def process_event(self, content: Dict) -> bool:
+        '''
+        Stores the states pushed by the server in an 'EVENT' message.
+
+        Returns
+        -------
+        False if the content is not an event.
+        '''
+        if content.get('action') != 'EVENT':
+            return False
+        with self.pushed_condition:
+            self.pushed_states.update(json.loads(content['result']))
+            self.pushed_count += 1
+            self.pushed_condition.notify_all()
+        return True
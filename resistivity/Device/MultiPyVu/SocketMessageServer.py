@@ -9,7 +9,9 @@ Created on Mon Jun 7 23:47:19 2021
 """
 
 import logging
-from typing import Dict
+import json
+import time
+from typing import Dict, Union
 
 from .SocketMessage import Message
 from .instrument import Instrument
@@ -34,6 +36,17 @@ class ServerMessage(Message):
         self.scaffolding = instr.scaffolding_mode
         self.server_threading = instr.run_with_threading
         self.logger = logging.getLogger(SERVER_NAME)
+        # subscription of the client to the state changes
+        self.subscription_period = None     # seconds, None if not subscribed
+        self.subscription_sdos = ''         # SDO queries separated by ';'
+        self._next_push = 0.0
+        self._pushed_snapshot = {}
+        # time from the request received to the response sent, in seconds
+        self._request_time = 0.0
+        self.request_count = 0
+        self.latency_total = 0.0
+        self.latency_min = float('inf')
+        self.latency_max = 0.0
 
     #########################################
     #
@@ -41,19 +54,15 @@ class ServerMessage(Message):
     #
     #########################################
 
-    def _create_response_json_content(self, resultText) -> Dict:
+    def _create_response_content(self, resultText) -> Dict:
         req_content = self.request['content']
         content = {'action': req_content['action'],
                    'query': req_content['query'],
                    'result': resultText}
-
-        content_encoding = 'utf-8'
-        response = {
-            'content_bytes': self._json_encode(content, content_encoding),
-            'content_type': 'text/json',
-            'content_encoding': content_encoding,
-        }
-        return response
+        if 'id' in req_content:
+            # pipelined request, the client matches the response with its id
+            content['id'] = req_content['id']
+        return content
 
     def _reset_read_state(self):
         '''
@@ -78,35 +87,30 @@ class ServerMessage(Message):
         try:
             self._read()
         except ClientCloseError:
-            # This is thrown if the server or the client shut down. If
-            # the client shuts down, the server should just keep waiting
-            # for a new client to appear, so nothing happens
-            pass
+            # This is thrown if the client shut down.  The server keeps
+            # serving the other clients and waiting for new ones.
+            self.shutdown()
+            raise
 
         self.process_read()
 
         # Set selector to listen for write events, we're done reading.
-        self._set_selector_events_mask('w')
+        # A partial request is completed by the next reads.
+        if self.request:
+            self._set_selector_events_mask('w')
 
     def process_read(self):
         # The data is transferred with a header that starts with two bytes
         # which gives the length of the rest of the header (the header also
-        # has variable length).  The last section contains the data. Each
-        # of these are processed one at a time, and the buffer, which is
-        # stored in self._recv_buffer, is trimmed after each state is looked
-        # at so that by the end, self._recv_buffer just holds the data (action,
-        # request, and response).
-
-        if self._jsonheader_len == 0:
-            self.process_protoheader()
-
-        if self._jsonheader_len > 0:
-            if self.jsonheader == {}:
-                self.process_jsonheader()
-
-        if self.jsonheader != {}:
-            if self.request == {}:
-                self.process_request()
+        # has variable length), or 0 for a binary message.  The last section
+        # contains the data.  The buffer, which is stored in
+        # self._recv_buffer, can hold several pipelined requests: the first
+        # complete one is removed from it (see pop_message), and the next
+        # ones are read once it is answered.
+        if self.request == {}:
+            content = self.pop_message()
+            if content is not None:
+                self.process_request(content)
 
     def write(self):
         if self.request:
@@ -116,36 +120,33 @@ class ServerMessage(Message):
         self._write()
 
         # Close when the buffer is drained. The response has been sent.
-        # Note that the Message class only handles one message per connection,
-        # so after the response is written there is nothing left to do.
+        # Pipelined requests can already be in the receive buffer: they
+        # are answered one after the other, in the order they were sent.
         if self._sent_success and not self._send_buffer:
-            self._check_exit()
-            self._reset_read_state()
+            if self.response_created:
+                self._record_latency()
+                self._check_exit()
+                self._reset_read_state()
+            # else only pushed events were sent, a request can be
+            # partially read
             # Set selector to listen for read events, we're done writing.
             self._set_selector_events_mask('r')
 
             # if there is more to read, then continue to read the buffer
             if self._recv_buffer:
                 self.process_read()
+                if self.request:
+                    # the next request is complete, answer it
+                    self._set_selector_events_mask('w')
 
-    def process_request(self):
-        # read the buffer into 'data'
-        content_len = self.jsonheader['content-length']
-        if len(self._recv_buffer) < content_len:
-            return
-
-        data = self._recv_buffer[:content_len]
-        encoding = self.jsonheader['content-encoding']
-
-        # clear the request from the buffer
-        self._recv_buffer = self._recv_buffer[content_len:]
-
-        # process 'data'
-        content = self._json_decode(data, encoding)
+    def process_request(self, content: Dict):
         action = content['action']
         query = content['query']
         self.request = self.create_request(action, query)
-        self._log_received_result(repr(self.request["content"]))
+        self._request_time = time.perf_counter()
+        if 'id' in content:
+            self.request['content']['id'] = content['id']
+        self._log_received_result(self.request['content'])
 
     def create_response(self):
         content = self.request['content']
@@ -157,6 +158,8 @@ class ServerMessage(Message):
         if action == 'START':
             result = f'Connected to {self.instr.name} '
             result += f'MultiVuServer at {self.addr}'
+            # the client asks for the binary messages in the query
+            self.binary = self._str_to_start_options(query)['binary']
             # change the query to show if the verbose flag was selected
             self.request['content']['query'] = self._start_to_str()
         elif action == 'EXIT':
@@ -169,6 +172,24 @@ class ServerMessage(Message):
             self.logger.info(result)
             # Use the query to confirm the command was sent and received
             self.request['content']['query'] = action
+        elif action == 'STATE?':
+            # all the states in one round-trip, see Instrument.get_snapshot
+            result = self.instr.get_snapshot(query)
+        elif action == 'SUBSCRIBE':
+            # query = 'period;sdo query;sdo query...'
+            period, _, sdo_queries = query.partition(';')
+            try:
+                self.subscription_period = float(period)
+            except ValueError:
+                result = f'MultiPyVuError: Invalid period: {period}'
+            else:
+                self.subscription_sdos = sdo_queries
+                self._next_push = 0.0
+                self._pushed_snapshot = {}
+                result = f'Subscribed every {self.subscription_period} s'
+        elif action == 'UNSUBSCRIBE':
+            self.subscription_period = None
+            result = 'Unsubscribed'
         elif action:
             command = f'{action} {query}'
             try:
@@ -179,11 +200,67 @@ class ServerMessage(Message):
             result = f"The command '{action}' has not been implemented."
         self.response = {'action': action, 'query': query, 'result': result}
 
-        response = self._create_response_json_content(result)
-        message = self._create_message(**response)
+        message = self._encode_content(self._create_response_content(result))
         self.response_created = True
         self._send_buffer += message
 
+    def push_events(self) -> Union[float, None]:
+        '''
+        When the client is subscribed, reads the states every
+        subscription_period and sends the ones which changed to the client,
+        in an 'EVENT' message whose result is a JSON dictionary (see
+        Instrument.get_snapshot).  The first event has all the states.
+
+        Returns
+        -------
+        The time (time.monotonic()) of the next reading, or None if the
+        client is not subscribed.
+        '''
+        if self.subscription_period is None or self.sock is None:
+            return None
+        now = time.monotonic()
+        if now < self._next_push:
+            return self._next_push
+        self._next_push = now + self.subscription_period
+        snapshot = json.loads(self.instr.get_snapshot(self.subscription_sdos))
+        changes = {command: result for command, result in snapshot.items()
+                   if self._pushed_snapshot.get(command) != result}
+        if changes:
+            self._pushed_snapshot = snapshot
+            content = {'action': 'EVENT',
+                       'query': '',
+                       'result': json.dumps(changes)}
+            # messages are added whole, after the response being sent
+            self._send_buffer += self._encode_content(content)
+            self._set_selector_events_mask('w')
+        return self._next_push
+
+    def _record_latency(self):
+        latency = time.perf_counter() - self._request_time
+        self.request_count += 1
+        self.latency_total += latency
+        self.latency_min = min(self.latency_min, latency)
+        self.latency_max = max(self.latency_max, latency)
+
+    def latency_stats(self) -> Dict[str, Union[float, int, str]]:
+        '''
+        The statistics of the time between a request is received and its
+        response is sent, in milliseconds.
+
+        Returns
+        -------
+        dict
+            With keys 'address', 'requests', 'mean_ms', 'min_ms' and
+            'max_ms'.
+        '''
+        count = self.request_count
+        return {'address': f'{self.addr[0]}:{self.addr[1]}',
+                'requests': count,
+                'mean_ms': 1e3 * self.latency_total / count if count else 0.0,
+                'min_ms': 1e3 * self.latency_min if count else 0.0,
+                'max_ms': 1e3 * self.latency_max,
+                }
+
     def connect_sock(self):
         '''
         Accept a socket connection and update the selector.
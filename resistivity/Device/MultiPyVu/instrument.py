@@ -12,6 +12,7 @@ from sys import platform
 import subprocess
 import time
 import re
+import json
 import logging
 from enum import Enum, auto
 from typing import Tuple
@@ -102,6 +103,15 @@ class Instrument():
                     err_msg += f'\n\t{f}'
                 raise MultiPyVuError(err_msg)
 
+        # The clients share the states read from MultiVu during cache_age
+        # seconds.  MultiVu is only called from the server thread, which
+        # answers the clients one request at a time (see MultiVuServer), so
+        # the cache needs no lock.
+        self.cache_age = 0.0
+        self._state_cache = {}
+        self.com_calls = 0      # number of calls to MultiVu
+        self.cache_hits = 0     # number of states read from the cache
+
         self._got_threaded_win32 = False
         self.exe_name = ''
         self.class_id = ''
@@ -408,6 +418,52 @@ class Instrument():
             return f'No argument(s) given for command {command_args}.'
         else:
             if query:
-                return self.mvu_commands.get_state(cmd, params)
-            else:
-                return self.mvu_commands.set_state(cmd, params)
+                return self._get_state_cached(cmd, params)
+            # the set can change any state
+            self._state_cache.clear()
+            self.com_calls += 1
+            return self.mvu_commands.set_state(cmd, params)
+
+    def _get_state_cached(self, cmd: str, params: str) -> str:
+        '''
+        Returns the state read from MultiVu less than cache_age seconds
+        ago, or reads it.  Errors are not cached.
+        '''
+        key = (cmd, params)
+        if self.cache_age > 0 and key in self._state_cache:
+            read_time, result = self._state_cache[key]
+            if time.monotonic() - read_time < self.cache_age:
+                self.cache_hits += 1
+                return result
+        self.com_calls += 1
+        result = self.mvu_commands.get_state(cmd, params)
+        self._state_cache[key] = (time.monotonic(), result)
+        return result
+
+    def get_snapshot(self, sdo_queries: str = '') -> str:
+        '''
+        Reads the temperature, the field, the chamber and a list of SDOs
+        in one call, for the snapshot command.
+
+        Parameters
+        ----------
+        sdo_queries: str
+            The SDO queries, as given by str(SdoObject), separated by ';'.
+
+        Returns
+        -------
+        str
+            A JSON dictionary whose keys are the commands ('TEMP?',
+            'FIELD?', 'CHAMBER?' and 'SDO? {sdo_query}') and whose values
+            are the results of parse_cmd().  A failed command gives the
+            MultiPyVuError message.
+        '''
+        commands = ['TEMP?', 'FIELD?', 'CHAMBER?']
+        commands += [f'SDO? {sdo}' for sdo in sdo_queries.split(';') if sdo]
+        snapshot = {}
+        for command in commands:
+            try:
+                snapshot[command] = self.parse_cmd(command)
+            except MultiPyVuError as e:
+                snapshot[command] = e.value
+        return json.dumps(snapshot)
@@ -1,10 +1,12 @@
 import pyvisa ,time,string
 import random
+import numpy as np
 
 
 class device:
-    def __init__(self,port):
-        self.rm = pyvisa.ResourceManager()
+    def __init__(self,port,rm=None):
+        # rm: a pyvisa ResourceManager shared with other devices, or None for a new one
+        self.rm = pyvisa.ResourceManager() if rm is None else rm
         self.device = self.rm.open_resource(port)
         self.device.write_termination = '\n'
         self.device.read_termination = '\r'
@@ -58,6 +60,10 @@ class device:
                 25 : "500mV",
                 26 : "1V"}
 
+    def close(self):
+        # Closes the connection to this device only, not the ResourceManager
+        self.device.close()
+
     def reset(self):
         self.device.write('*RST')
     def clear(self):
@@ -151,6 +157,11 @@ class device:
     #get data
     def get_all(self):
         return self.device.query("SNAP?1,2,3,4")
+    def snap(self,*parameters):
+        # Values of 2 to 6 parameters taken at the same time, in one query:
+        # 1 X, 2 Y, 3 R, 4 Theta, 5-8 Aux In 1-4, 9 Ref frequency, 10-11 CH1-2 display
+        data = self.device.query('SNAP? ' + ','.join('%i' % p for p in parameters))
+        return [float(value) for value in data.split(',')]
     def get_X(self):
         return float(self.device.query('OUTP? 1'))
     def get_Y(self):
@@ -173,6 +184,38 @@ class device:
         return float(self.device.query('AUXV? %i' %output))
 
 
+    #data buffer (streaming)
+    def set_sample_rate(self,rate):
+        # 0 is 62.5 mHz, 13 is 512 Hz (rate = 2**(i-4) Hz), 14 is trigger
+        self.device.write('SRAT %i' % rate)
+    def get_sample_rate(self):
+        return int(self.device.query('SRAT?'))
+    def set_buffer_mode(self,mode):
+        # 0 is one shot (stops when full), 1 is loop
+        self.device.write('SEND %i' % mode)
+    def start_buffer(self):
+        self.device.write('STRT')
+    def pause_buffer(self):
+        self.device.write('PAUS')
+    def reset_buffer(self):
+        self.device.write('REST')
+    def get_buffer_length(self):
+        return int(self.device.query('SPTS?'))
+    def read_buffer(self,channel,start,count,binary_format='TRCB'):
+        # Binary transfer of count points of the buffer of channel (1 or 2)
+        # from the point start, decoded as a numpy array
+        if count <= 0:
+            return np.empty(0)
+        self.device.write('%s? %i,%i,%i' % (binary_format,channel,start,count))
+        raw = self.device.read_bytes(4*count)
+        if binary_format == 'TRCB':
+            # IEEE floats, little endian
+            return np.frombuffer(raw, dtype='<f4').astype(float)
+        # TRCL: 16 bits mantissa and 16 bits exponent, value = m * 2**(e-124)
+        data = np.frombuffer(raw, dtype='<i2').reshape(count, 2)
+        return data[:, 0] * 2.0**(data[:, 1].astype(float) - 124)
+
+
 
 
 
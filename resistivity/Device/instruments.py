@@ -1,9 +1,62 @@
-from time import sleep
+from time import sleep, time, monotonic
+import threading
+from concurrent.futures import Future
+import numpy as np
+from resistivity.Experiment.data_buffer import DataBuffer
+from .MCLpy.DataClasses import lockin_frame_dtype
+
+
+class SessionRegistry:
+    """
+    Connections to the physical instruments, shared by all the Instrument
+    objects with the same key (driver, address). A connection is opened by
+    the first acquire and closed by the last release (reference counting).
+    """
+    def __init__(self):
+        self.sessions = {} # key: [Future of the connection, number of users]
+        self.lock = threading.Lock()
+
+    def acquire(self, key, connect):
+        """
+        Returns the connection of key, opened with connect() if needed. The
+        connections of different keys are opened in parallel, the other
+        users of a key wait for its first user to open it
+        """
+        with self.lock:
+            opening = key not in self.sessions
+            if opening:
+                self.sessions[key] = [Future(), 0]
+            session = self.sessions[key]
+            session[1] += 1
+        if opening:
+            try:
+                session[0].set_result(connect())
+            except BaseException as error:
+                with self.lock:
+                    del self.sessions[key]
+                session[0].set_exception(error) # raised for the users waiting
+                raise
+        return session[0].result()
+
+    def release(self, key, disconnect=None):
+        """Stops using the connection of key, closed with disconnect(connection) by its last user"""
+        with self.lock:
+            self.sessions[key][1] -= 1
+            if self.sessions[key][1] > 0:
+                return
+            connection = self.sessions.pop(key)[0].result()
+        if disconnect is not None:
+            disconnect(connection)
+
+sessions = SessionRegistry()
+
 
 class Instrument:
     """API for all the instruments"""
     channel_dict = {} # this are class attributes, accessible without declaring the object
     quantities = []
+    requested_quantities = None # quantities logged, set by LogMeasure (None for all)
+    stream_data = None # DataBuffer of the points of a high rate channel, saved by LogMeasure
 
     def __init__(self, address):
         self.address = address
@@ -12,6 +65,11 @@ class Instrument:
     def get_values(self, channel):
         pass
 
+    def session_key(self):
+        """Instruments with the same session key share one connection and
+        are never queried at the same time"""
+        return (type(self).__name__, self.address)
+
     def initialize(self):
         pass
 
@@ -20,99 +78,299 @@ class Instrument:
 
 
 class SynkTek(Instrument):
+    """
+    A MCL lock-in, the channel is the input and the lock-in set, for example
+    "A-V1_L2" (L1 by default). The channels of an address share one MCL
+    session, the different addresses are read in parallel.
+    """
     channel_dict = {'A-V1':0, 'A-V2':1, 'B-V1':2, 'B-V2':3, 'C-V1':4,
                 'C-V2':5, 'D-V1':6, 'D-V2':7, 'E-V1':8, 'E-V2':9, 'A-I':10}
-    quantities = ["R", "theta", "X", "Y", "DC"]
-    communicating = False
-    from .MCLpy.MCL import MCL
-    mcl = MCL()
+    lockin_sets = ['L1', 'L2']
+    quantities = ["R", "theta", "X", "Y", "DC", "time_s"]
+    # latest: the last frame at each point, average: the average of the frames
+    # received since the last point, frames: average, and every frame saved in stream_data
+    mode = "latest"
+    decimation = 1 # frames mode: number of frames averaged in each point of stream_data
+    stream_max_points = 1000000 # number of points of the frames kept in memory
+    connect_timeout = 10 # seconds to connect, and to sync the config before changing it
 
     def __init__(self, address):
         self.address = address
+        self.mcl = None
+        self.history_count = {} # number of frames of the history of each lock-in set already read
+        self.lost_frames = 0 # frames dropped from the history before being read
+        self.pending_frames = [] # frames mode: frames waiting for a full block of decimation frames
 
     def initialize(self):
-        if not SynkTek.communicating:
-            self.mcl.connect(self.address)
-            SynkTek.communicating = True
+        if self.mcl is None:
+            try:
+                self.mcl = sessions.acquire(self.session_key(), self.connect)
+            except ConnectionError as error:
+                print("Could not connect to the MCL " + self.address + ": " + str(error))
+                raise # get_values needs the session
+        if self.mode != "latest":
+            for lockin_set in self.lockin_sets:
+                lockin = getattr(self.mcl.data, lockin_set)
+                lockin.recording = True
+                self.history_count[lockin_set] = lockin.frame_count # start from the next frame
+            if self.mode == "frames" and self.stream_data is None:
+                self.stream_data = DataBuffer(['Timestamp', 'time_s', 'X', 'Y', 'R', 'theta', 'DC'],
+                                              max_length=self.stream_max_points)
+
+    def connect(self):
+        from .MCLpy.MCL import MCL
+        mcl = MCL()
+        # The config variables are synced in the background, the data is received right away
+        mcl.connect(self.address, timeout=self.connect_timeout, wait_sync=False)
+        return mcl
 
     def finalize(self):
-        if SynkTek.communicating:
-            self.mcl.disconnect()
-            SynkTek.communicating = False
+        if self.mcl is not None:
+            sessions.release(self.session_key(), lambda mcl: mcl.disconnect())
+            self.mcl = None
+
+    def parse_channel(self, channel):
+        """Returns the index of the input and the name of the lock-in set of channel"""
+        channel, _, lockin_set = channel.partition("_")
+        lockin_set = lockin_set or "L1"
+        if lockin_set not in self.lockin_sets:
+            raise ValueError("You defined a lockin " + lockin_set + " that does not exist")
+        return self.channel_dict[channel], lockin_set
 
     def get_values(self, channel):
-        # channel = channel.split("_")[0]
-        lockin = "L1" #channel.split("_")[-1]
-        ## Choose the right lockin
-        if "L1" in lockin:
-            values = self.mcl.data.L1
-        elif "L2" in lockin:
-            values = self.mcl.data.L2
-        else:
-            print("You defined a lockin L that does not exist")
+        index, lockin_set = self.parse_channel(channel)
+        if self.mode != "latest":
+            return self.get_history_values(index, lockin_set)
+        ## All the values from the same frame
+        frame = getattr(self.mcl.data, lockin_set).val
         ## Choose the variables to save
         # if channel == 'Output':
         #     values = {'Freq': self.values.lock_in_frequency,
         #               'Amp': self.values.output_amplitude}
         # else:
-        values = {'R': values.r[self.channel_dict[channel]],
-                  'theta': values.theta[self.channel_dict[channel]],
-                  'X': values.x[self.channel_dict[channel]],
-                  'Y': values.y[self.channel_dict[channel]],
-                  'DC': values.dc[self.channel_dict[channel]]
+        values = {'R': frame['r'][index],
+                  'theta': frame['thetadeg'][index],
+                  'X': frame['x'][index],
+                  'Y': frame['y'][index],
+                  'DC': frame['dc'][index],
+                  'time_s': frame['time_s']
                   }
         return values
 
+    def read_history(self, index, lockin_set):
+        """
+        Reads the frames of the lock-in set received since the last call, and
+        returns the values of the input index in them as a dictionnary of arrays
+        """
+        frames, count = getattr(self.mcl.data, lockin_set).get_history(self.history_count[lockin_set])
+        self.lost_frames += count - self.history_count[lockin_set] - len(frames)
+        self.history_count[lockin_set] = count
+        frames_array = np.array([frame for _, frame in frames], dtype=lockin_frame_dtype)
+        return {'Timestamp': np.array([timestamp for timestamp, _ in frames]),
+                'time_s': frames_array['time_s'].astype(float),
+                'X': frames_array['x'][:, index].astype(float),
+                'Y': frames_array['y'][:, index].astype(float),
+                'R': frames_array['r'][:, index].astype(float),
+                'theta': frames_array['thetadeg'][:, index].astype(float),
+                'DC': frames_array['dc'][:, index].astype(float)}
+
+    def save_frames(self, values):
+        """Adds the frames to stream_data, by blocks of decimation frames averaged"""
+        self.pending_frames.append(values)
+        pending = {key: np.concatenate([frames[key] for frames in self.pending_frames]) for key in values}
+        n_blocks = len(pending['X']) // self.decimation
+        length = n_blocks * self.decimation
+        self.pending_frames = [{key: column[length:] for key, column in pending.items()}]
+        if n_blocks:
+            blocks = {key: column[:length].reshape(n_blocks, self.decimation).mean(axis=1)
+                      for key, column in pending.items()}
+            blocks['R'] = np.hypot(blocks['X'], blocks['Y'])
+            blocks['theta'] = np.degrees(np.arctan2(blocks['Y'], blocks['X']))
+            self.stream_data.extend(blocks)
+
+    def get_history_values(self, index, lockin_set):
+        values = self.read_history(index, lockin_set)
+        if self.mode == "frames":
+            self.save_frames(values)
+        # One point per tick: the average of the frames received since the last one
+        X = np.mean(values['X']) if len(values['X']) else np.nan
+        Y = np.mean(values['Y']) if len(values['Y']) else np.nan
+        DC = np.mean(values['DC']) if len(values['DC']) else np.nan
+        time_s = np.mean(values['time_s']) if len(values['time_s']) else np.nan
+        return {'R': np.hypot(X, Y), 'theta': np.degrees(np.arctan2(Y, X)), 'X': X, 'Y': Y, 'DC': DC, 'time_s': time_s}
+
     def switch_source(self, state):
+        if not self.mcl.wait_sync(self.connect_timeout):
+            return # the other config values would be overwritten
         self.mcl.config.output_A.outputenabled = state
 
 
 class LockinSR830(Instrument):
-    channel_dict = {}
-    quantities = ["R", "theta", "X", "Y"]
+    # Snap: one SNAP? query per point, Stream: all the points of the buffer at stream_rate
+    channel_dict = {'Snap': 0, 'Stream': 1}
+    quantities = ["R", "theta", "X", "Y", "Aux1", "Aux2", "Aux3", "Aux4", "Freq"]
+    snap_dict = {'X': 1, 'Y': 2, 'R': 3, 'theta': 4, 'Aux1': 5, 'Aux2': 6,
+                 'Aux3': 7, 'Aux4': 8, 'Freq': 9} # parameters of SNAP?
+    stream_rate = 13 # SRAT index, the rate is 2**(stream_rate-4) Hz, 13 is 512 Hz
+    stream_max_points = 1000000 # number of points of the stream kept in memory
+    buffer_size = 16383 # number of points of the SR830 buffer
 
     def __init__(self, address):
         self.address = address
         self.sr830 = None
+        self.streaming = False
 
     def initialize(self):
-        from .SR830 import SR830
-        self.sr830 = SR830.device(self.address)
+        if self.sr830 is None:
+            import pyvisa
+            from .SR830 import SR830
+            # One ResourceManager for all the SR830, one connection per address
+            rm = sessions.acquire(('pyvisa',), pyvisa.ResourceManager)
+            try:
+                self.sr830 = sessions.acquire(self.session_key(), lambda: SR830.device(self.address, rm))
+            except Exception:
+                sessions.release(('pyvisa',), lambda rm: rm.close())
+                raise
 
     def finalize(self):
-        self.sr830.rm.close()
-        self.sr830 = None
+        if self.streaming:
+            self.sr830.pause_buffer()
+            self.streaming = False
+        if self.sr830 is not None:
+            sessions.release(self.session_key(), lambda sr830: sr830.close())
+            sessions.release(('pyvisa',), lambda rm: rm.close())
+            self.sr830 = None
 
     def get_values(self, channel):
-        values = {'X': self.sr830.get_X(),
-                  'Y': self.sr830.get_Y(),
-                  'R': self.sr830.get_R(),
-                  'theta': self.sr830.get_Theta()
-                  }
+        return self.get_many_values([channel], [self])[0]
+
+    def get_many_values(self, channels, instruments):
+        """
+        Values of several labels of the same SR830 (instruments are their
+        objects): the quantities of all the Snap channels are read together
+        """
+        quantities = []
+        for channel, instrument in zip(channels, instruments):
+            if channel != 'Stream':
+                quantities += [quantity for quantity in instrument.snap_quantities() if quantity not in quantities]
+        values = self.snap(quantities)
+        return [instrument.get_stream_values() if channel == 'Stream'
+                else {quantity: values[quantity] for quantity in instrument.snap_quantities()}
+                for channel, instrument in zip(channels, instruments)]
+
+    def snap_quantities(self):
+        """The logged quantities read with SNAP?"""
+        quantities = self.requested_quantities or ["X", "Y", "R", "theta"]
+        return [quantity for quantity in quantities if quantity in self.snap_dict]
+
+    def snap(self, quantities):
+        """Reads the quantities in the fewest SNAP? queries"""
+        values = {}
+        ## SNAP? reads up to 6 values at the same time, in one query
+        for i in range(0, len(quantities), 6):
+            group = quantities[i:i + 6]
+            parameters = [self.snap_dict[quantity] for quantity in group]
+            if len(parameters) == 1:
+                parameters.append(self.snap_dict['X'] if parameters[0] != 1 else self.snap_dict['Y']) # SNAP? needs 2 parameters
+            values.update(zip(group, self.sr830.snap(*parameters)))
         return values
 
+    def start_stream(self):
+        """Stores X and Y in the buffer of the SR830 at stream_rate"""
+        self.sr830.set_disp_rat(1, 0, 0) # CH1 displays X
+        self.sr830.set_disp_rat(2, 0, 0) # CH2 displays Y
+        self.sr830.set_sample_rate(self.stream_rate)
+        self.sr830.set_buffer_mode(0) # one shot, the buffer is restarted before being full
+        if self.stream_data is None:
+            self.stream_data = DataBuffer(['Timestamp', 'X', 'Y', 'R', 'theta'], max_length=self.stream_max_points)
+        self.restart_stream()
+        self.streaming = True
+
+    def restart_stream(self):
+        self.sr830.reset_buffer()
+        self.sr830.start_buffer()
+        self.stream_start = time() # timestamp of the first point of the buffer
+        self.stream_index = 0 # number of points of the buffer already read
+
+    def read_stream(self):
+        """
+        Reads the new points of the buffer with binary transfers, adds them to
+        stream_data and returns them as a dictionnary of arrays
+        """
+        count = self.sr830.get_buffer_length() - self.stream_index
+        X = self.sr830.read_buffer(1, self.stream_index, count)
+        Y = self.sr830.read_buffer(2, self.stream_index, count)
+        values = {'Timestamp': self.stream_start + (self.stream_index + np.arange(count)) / 2.0**(self.stream_rate - 4),
+                  'X': X,
+                  'Y': Y,
+                  'R': np.hypot(X, Y),
+                  'theta': np.degrees(np.arctan2(Y, X))}
+        self.stream_index += count
+        if self.stream_index > self.buffer_size // 2:
+            self.restart_stream() # a few points are lost, but the buffer never gets full
+        self.stream_data.extend(values)
+        return values
+
+    def get_stream_values(self):
+        if not self.streaming:
+            self.start_stream()
+        values = self.read_stream()
+        # One point per tick: the average of the points read since the last one
+        X = np.mean(values['X']) if len(values['X']) else np.nan
+        Y = np.mean(values['Y']) if len(values['Y']) else np.nan
+        return {'X': X, 'Y': Y, 'R': np.hypot(X, Y), 'theta': np.degrees(np.arctan2(Y, X))}
+
 
 class LakeShore350(Instrument):
     channel_dict = {'A': 1, 'B': 2, 'C': 3, 'D': 4}
     quantities = ["Temperature", "Power"]
+    heater_outputs = (1, 2)
 
     def __init__(self, address):
         self.address = address
         self.ls350 = None
 
     def initialize(self):
-        from .LakeShore350 import temperature_controllers
-        self.ls350 = temperature_controllers.TemperatureController(ip_address=self.address, tcp_port=7777, timeout=1000)
+        if self.ls350 is None:
+            from .LakeShore350 import temperature_controllers
+            # One TCP connection per controller, shared by all its channels
+            self.ls350 = sessions.acquire(self.session_key(), lambda: temperature_controllers.TemperatureController(
+                ip_address=self.address, tcp_port=7777, timeout=1000))
 
     def finalize(self):
-        del self.ls350 # that shuts down the communication
-        self.ls350 = None
+        if self.ls350 is not None:
+            sessions.release(self.session_key(), lambda ls350: ls350.disconnect_tcp())
+            self.ls350 = None
 
     def get_values(self, channel):
-        values = {'Temperature': self.ls350.get_kelvin_reading(self.channel_dict[channel]),
-                  'Power': self.ls350.get_heater_output(self.channel_dict[channel])}
+        return self.get_many_values([channel])[0]
+
+    def get_many_values(self, channels, instruments=None):
+        """
+        Values of several channels of the controller, read in one query
+        (instruments are the objects of the labels): the heater output is
+        only read for the labels which log the Power
+        """
+        if instruments is None:
+            instruments = [self] * len(channels)
+        numbers = [self.channel_dict[channel] for channel in channels]
+        ## HTR? only accepts the outputs 1 and 2, the inputs C and D have no heater
+        outputs = sorted({number for number, instrument in zip(numbers, instruments)
+                          if instrument.reads_power() and number in self.heater_outputs})
+        temperatures, powers = self.ls350.get_readings(numbers, outputs)
+        powers = dict(zip(outputs, powers))
+        values = []
+        for number, temperature, instrument in zip(numbers, temperatures, instruments):
+            label_values = {'Temperature': temperature}
+            if instrument.reads_power():
+                label_values['Power'] = powers.get(number, np.nan)
+            values.append(label_values)
         return values
 
+    def reads_power(self):
+        """Whether the label logs the heater output"""
+        return 'Power' in (self.requested_quantities or self.quantities)
+
 
 class RandomInt(Instrument):
     channel_dict = {}
@@ -148,10 +406,11 @@ class PPMS(Instrument):
     quantities = ['Temperature','Field']
 
     communicating = False
+    push_period = 1 # seconds between the states pushed by the server, None to poll
 
     import platform
     if platform.system() == 'Windows':
-        from MultiPyVu import Server, Client
+        from .MultiPyVu import Server, Client
         ppms_server = Server(port=6000)
         ppms_client = Client(port=6000)
 
@@ -169,6 +428,9 @@ class PPMS(Instrument):
             PPMS.communicating = True
             #self.ppms_client.log_event.shutdown() # turn off logging
             self.ppms_client.log_event.remove()
+            if self.push_period:
+                # The server sends the states when they change (see wait_stable)
+                self.ppms_client.subscribe(self.push_period)
 
     def finalize(self):
         if PPMS.communicating:
@@ -176,11 +438,15 @@ class PPMS(Instrument):
             self.ppms_server.close()
             PPMS.communicating = False
 
+    def session_key(self):
+        return (type(self).__name__,) # one client shared by all the objects
+
     def get_values(self, channel):
         self.ppms_client.log_event.remove()
-        temperature, status_temperature = self.ppms_client.get_temperature()
-        sleep(0.5)
-        field, status_field = self.ppms_client.get_field()
+        # All the states read by the server at once, in one round-trip
+        states = self.ppms_client.get_state_snapshot()
+        temperature, status_temperature = states['temperature']
+        field, status_field = states['field']
         if status_temperature == 'Stable':
             status_temperature = 1
         else:
@@ -194,4 +460,20 @@ class PPMS(Instrument):
     def set_temp(self, temperature, rate):
         self.ppms_client.set_temperature(temperature, rate, self.ppms_client.temperature.approach_mode.fast_settle)
 
+    def wait_stable(self, timeout=0):
+        """
+        Waits until the temperature is stable, on the states pushed by the
+        server, or by reading them every second if push_period is None.
+        Returns False if it is not stable after timeout seconds (0 to wait forever)
+        """
+        is_stable = lambda states: states['temperature'][1] == 'Stable'
+        if self.push_period:
+            return self.ppms_client.wait_for_state(is_stable, timeout)
+        start = monotonic()
+        while not is_stable(self.ppms_client.get_state_snapshot()):
+            if timeout and monotonic() - start > timeout:
+                return False
+            sleep(1)
+        return True
+
 
@@ -0,0 +1,161 @@
+import threading
+from collections.abc import Mapping
+import numpy as np
+
+
+class DataBuffer(Mapping):
+    """
+    Columnar storage for the logged data, used as LogMeasure.data_dict
+
+    Each column is a preallocated numpy array which doubles its capacity when
+    full, so that adding a point costs O(1) amortized instead of the full copy
+    done by np.append. Reading a column (data_dict[key]) returns a view on the
+    stored points, without any copy. The points of a view are never
+    overwritten: the new points are written after them, and the arrays are
+    replaced by new ones when they are moved or cleared, so the views can
+    be used after the lock is released.
+
+    - max_length: the maximum number of points kept in memory. Once reached,
+    the oldest points are dropped (ring buffer). None means no limit.
+    - capacity: the number of points initially allocated per column
+    """
+    def __init__(self, keys=(), max_length=None, capacity=1024):
+        self.max_length = max_length
+        self._capacity  = capacity if max_length is None else min(capacity, max_length)
+        self._columns   = {}
+        self._start     = 0 # index of the oldest point in the arrays
+        self._length    = 0 # number of points currently stored
+        self._count     = 0 # number of points appended since the creation
+        self._lock      = threading.RLock()
+        for key in keys:
+            self.add_column(key)
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._columns[key][self._start:self._start + self._length]
+
+    def __iter__(self):
+        return iter(list(self._columns))
+
+    def __len__(self):
+        return len(self._columns)
+
+    @property
+    def size(self):
+        """Number of points stored in each column"""
+        return self._length
+
+    @property
+    def count(self):
+        """Number of points appended since the creation of the buffer, it
+        never decreases so readers can tell how many points are new"""
+        return self._count
+
+    def add_column(self, key):
+        """Add an empty column, filled with NaN for the points already stored"""
+        with self._lock:
+            if key not in self._columns:
+                self._columns[key] = np.full(self._capacity, np.nan)
+
+    def append(self, values):
+        """
+        Add one point to every column. values is a dictionnary {key: value},
+        the columns missing from it are filled with NaN.
+        """
+        with self._lock:
+            end = self._start + self._length
+            if end == self._capacity:
+                self._make_room()
+                end = self._start + self._length
+            for key, column in self._columns.items():
+                value = values.get(key, np.nan)
+                try:
+                    column[end] = value
+                except (TypeError, ValueError):
+                    # Non numerical value (a status string for example)
+                    column = self._columns[key] = column.astype(object)
+                    column[end] = value
+            if self.max_length is not None and self._length == self.max_length:
+                self._start += 1 # drop the oldest point
+            else:
+                self._length += 1
+            self._count += 1
+
+    def extend(self, values):
+        """
+        Add several points to every column. values is a dictionnary
+        {key: array}, the arrays having the same length, the columns missing
+        from it are filled with NaN.
+        """
+        with self._lock:
+            n = len(next(iter(values.values())))
+            if self.max_length is not None:
+                if n > self.max_length:
+                    # Only the last max_length points are kept
+                    self._count += n - self.max_length
+                    values = {key: value[n - self.max_length:] for key, value in values.items()}
+                    n = self.max_length
+                dropped = max(self._length + n - self.max_length, 0) # oldest points
+                self._start  += dropped
+                self._length -= dropped
+            while self._start + self._length + n > self._capacity:
+                self._make_room()
+            end = self._start + self._length
+            for key, column in self._columns.items():
+                value = values.get(key, np.nan)
+                try:
+                    column[end:end + n] = value
+                except (TypeError, ValueError):
+                    column = self._columns[key] = column.astype(object)
+                    column[end:end + n] = value
+            self._length += n
+            self._count  += n
+
+    def _make_room(self):
+        if self.max_length is None:
+            new_capacity = 2 * self._capacity
+        else:
+            new_capacity = min(2 * self._capacity, self.max_length + max(self.max_length // 4, 1))
+        ## Copy the kept points at the beginning of new arrays, larger until
+        ## the memory budget is reached. With a max_length, this happens once
+        ## every max_length/4 points. The arrays are not modified in place,
+        ## the views given to the readers keep their points.
+        for key, column in self._columns.items():
+            new_column = np.full(max(new_capacity, self._capacity), np.nan, dtype=column.dtype)
+            new_column[:self._length] = column[self._start:self._start + self._length]
+            self._columns[key] = new_column
+        self._capacity = max(new_capacity, self._capacity)
+        self._start = 0
+
+    def last(self):
+        """Returns the last point of every column as a dictionnary"""
+        with self._lock:
+            index = self._start + self._length - 1
+            return {key: column[index] for key, column in self._columns.items()}
+
+    def get_columns(self, keys):
+        """Returns views of several columns, guaranteed to have the same length"""
+        with self._lock:
+            return [self[key] for key in keys]
+
+    def snapshot(self, keys):
+        """Returns the count and the views of several columns, taken at the same time"""
+        with self._lock:
+            return self._count, [self[key] for key in keys]
+
+    def clear(self):
+        """Delete all the points but keep the columns"""
+        with self._lock:
+            # New arrays, the views of the deleted points keep them
+            for key, column in self._columns.items():
+                self._columns[key] = np.full(self._capacity, np.nan, dtype=column.dtype)
+            self._start  = 0
+            self._length = 0
+
+    def reset(self, keys=()):
+        """Delete all the points and columns, then add the columns in keys"""
+        with self._lock:
+            self._columns = {}
+            self.clear()
+            for key in keys:
+                self.add_column(key)
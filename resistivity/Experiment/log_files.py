@@ -0,0 +1,182 @@
+import os
+import numpy as np
+import yaml
+
+
+class CSVFile:
+    """The .dat text file: one line per point, values separated by commas"""
+    def __init__(self, filepath, header, metadata=None):
+        self.file = open(filepath, 'a')
+        if self.file.tell() == 0:
+            self.file.write("#" + ','.join(map(str, header)) + '\n')
+
+    def write(self, batch):
+        self.file.write(''.join(','.join(map(str, values)) + '\n' for values in batch))
+        self.file.flush()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class NPYColumn:
+    """
+    One column of a NPYFile: a .npy file of float64 which grows as the points
+    are written. The shape in its header is updated after each batch, so it
+    can be loaded (or memory-mapped) with np.load at any time.
+    """
+    header_size = 64 # the .npy header is padded to a multiple of this size
+    dtype = np.dtype('<f8')
+
+    def __init__(self, filepath):
+        if os.path.isfile(filepath) and os.path.getsize(filepath) > 0:
+            ## Append to an existing column
+            self.file = open(filepath, 'r+b')
+            if np.lib.format.read_magic(self.file) == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(self.file)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(self.file)
+            if dtype != self.dtype or len(shape) != 1:
+                self.file.close()
+                raise ValueError(filepath + " is not a column of a log")
+            self.data_offset = self.file.tell()
+            self.length = shape[0]
+            self.file.seek(self.data_offset + self.length * self.dtype.itemsize)
+        else:
+            self.file = open(filepath, 'w+b')
+            self.length = 0
+            self._write_header(reserve=True)
+            self.data_offset = self.file.tell()
+
+    def truncate(self, length):
+        """Keeps the first length points, the next ones are overwritten"""
+        self.length = min(self.length, length)
+        self.file.seek(self.data_offset + self.length * self.dtype.itemsize)
+
+    def _write_header(self, reserve=False):
+        header = repr({'descr': self.dtype.str, 'fortran_order': False, 'shape': (self.length,)})
+        if reserve:
+            header += ' ' * 20 # room for the number of points to grow
+        size = len(np.lib.format.MAGIC_PREFIX) + 4 + len(header) + 1
+        header += ' ' * (-size % self.header_size) + '\n'
+        if not reserve:
+            # Keep the size of the existing header, the data follows it
+            header = header.rstrip('\n ').ljust(self.data_offset - len(np.lib.format.MAGIC_PREFIX) - 5) + '\n'
+        self.file.write(np.lib.format.MAGIC_PREFIX + bytes([1, 0]))
+        self.file.write(len(header).to_bytes(2, 'little') + header.encode('latin1'))
+
+    def write(self, values):
+        self.file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.length += len(values)
+        ## Update the number of points in the header
+        self.file.seek(0)
+        self._write_header()
+        self.file.seek(self.data_offset + self.length * self.dtype.itemsize)
+        self.file.flush()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class NPYFile:
+    """
+    Binary log stored by columns: the log path is a directory (named with the
+    .npylog extension) with one .npy file of float64 per column (see NPYColumn), so reading one column of a
+    long run only reads this column from the disk. The column names, the
+    name of their files and the metadata (the config of the experiment) are
+    saved in columns.yml in the directory. Non numerical values are saved
+    as NaN.
+    """
+    def __init__(self, dirpath, header, metadata=None):
+        self.header = [str(key) for key in header]
+        index_path = os.path.join(dirpath, 'columns.yml')
+        if os.path.isfile(dirpath):
+            raise ValueError(dirpath + " is a file, not a log directory")
+        if os.path.isfile(index_path):
+            ## Append to an existing log, it must have the same columns
+            with open(index_path, 'r') as f:
+                index = yaml.safe_load(f)
+            if index['columns'] != self.header:
+                raise ValueError("The columns of " + dirpath + " are not the logged quantities")
+        os.makedirs(dirpath, exist_ok=True)
+        with open(index_path, 'w') as f:
+            yaml.dump({'columns': self.header, 'files': column_files(self.header), 'metadata': metadata},
+                      f, default_flow_style=False)
+        self.columns = [NPYColumn(os.path.join(dirpath, file)) for file in column_files(self.header)]
+        # A batch interrupted between two columns is dropped from all of them
+        length = min(column.length for column in self.columns) if self.columns else 0
+        for column in self.columns:
+            column.truncate(length)
+
+    def write(self, batch):
+        points = np.array([[_to_float(value) for value in values] for values in batch], dtype=float)
+        for i, column in enumerate(self.columns):
+            column.write(points[:, i])
+
+    def sync(self):
+        for column in self.columns:
+            column.sync()
+
+    def close(self):
+        for column in self.columns:
+            column.close()
+
+
+def column_files(header):
+    """Names of the files of the columns of a NPYFile, the names of the columns can have any character"""
+    return ["%03d.npy" % i for i in range(len(header))]
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+## File formats for the log, selected with the extension of the file
+file_formats = {'.npylog': NPYFile}
+
+
+def open_log_file(filepath, header, metadata=None):
+    """Opens the log file with the format matching its extension (.dat text by default)"""
+    FileClass = file_formats.get(os.path.splitext(filepath)[1].lower(), CSVFile)
+    return FileClass(filepath, header, metadata)
+
+
+def read_log(filepath):
+    """
+    Returns a dictionnary {column: array} of the data in a log file. The
+    columns of a .npylog log are memory-mapped: no data is read from the disk
+    before the arrays are used, and each column is contiguous on the disk.
+    The non numerical values of a .dat log are read as NaN, as in a .npylog.
+    """
+    if os.path.isdir(filepath):
+        with open(os.path.join(filepath, 'columns.yml'), 'r') as f:
+            index = yaml.safe_load(f)
+        return {key: np.load(os.path.join(filepath, file), mmap_mode='r')
+                for key, file in zip(index['columns'], index['files'])}
+    with open(filepath, 'r') as f:
+        header = f.readline().lstrip('#').strip().split(',')
+        ## The instruments can log text (a status for example)
+        rows = [[_to_float(value) for value in line.rstrip('\n').split(',')]
+                for line in f if line.strip() and not line.startswith('#')]
+    data = np.array(rows, dtype=float).reshape(-1, len(header))
+    return {key: data[:, i] for i, key in enumerate(header)}
+
+
+def npy_to_csv(npy_path, csv_filepath, chunk_size=100000):
+    """Converts a .npylog log into the .dat text format, chunk by chunk"""
+    data = read_log(npy_path)
+    columns = list(data.values())
+    length = min(len(column) for column in columns) if columns else 0
+    with open(csv_filepath, 'w') as f:
+        f.write("#" + ','.join(data.keys()) + '\n')
+        for start in range(0, length, chunk_size):
+            chunk = np.column_stack([column[start:start + chunk_size] for column in columns]).tolist()
+            f.write(''.join(','.join(map(str, values)) + '\n' for values in chunk))
@@ -1,11 +1,14 @@
-from time import sleep
+from time import sleep, time, monotonic
+from concurrent.futures import ThreadPoolExecutor
 import resistivity.Device.instruments as instruments
-import numpy as np
 import threading
 import os
 import yaml
 import inspect
 from .seebeck import Seebeck
+from .data_buffer import DataBuffer
+from .scheduler import Scheduler
+from .log_writer import LogWriter
 
 
 class LogMeasure:
@@ -17,14 +20,17 @@ class LogMeasure:
         self.saving          = False
         self.instruments_query = {}
         self.time_steps      = 1 # seconds
+        self.max_points      = 1000000 # number of points kept in memory for each quantity
+        self.scheduler       = Scheduler(self.time_steps)
+        self.time_origin     = None # monotonic time of the first point
+        self.last_values     = {} # last values read for each data label
+        self.log_writer      = None
+        self.stream_writers  = {} # writers of the high rate channels, and count of the points saved
+        self.closing_writers = [] # writers closed while logging, writing their last points
+        self.save_error      = None # error which stopped the saving
         ## Dictionnary for the data
-        self.data_dict = {}
-        self.data_dict['Time']   = np.empty(0)
-        self.data_dict['S_AC']   = np.empty(0)
-        self.data_dict['dT_AC']  = np.empty(0)
-        self.data_dict['Phi_dT'] = np.empty(0)
-        self.data_dict['Phi_VS'] = np.empty(0)
-        self.data_dict['dPhi']   = np.empty(0)
+        self.data_dict = DataBuffer(['Time', 'Timestamp', 'S_AC', 'dT_AC', 'Phi_dT', 'Phi_VS', 'dPhi'],
+                                    max_length=self.max_points)
         # Get the names of all the classes of instruments in this module
         self.instruments_names = [name for name, obj in inspect.getmembers(instruments) if isinstance(obj, type)]
         self.instruments_names.remove("Instrument") # this is the API
@@ -39,6 +45,9 @@ class LogMeasure:
             address   = self.config_dict["Measurements"][data_label]["address"]
             quantities = self.config_dict["Measurements"][data_label]["quantities"]
             self.add_instrument(instrument, address, data_label, quantities)
+            # Optional settings of the instrument, for example the mode of a SynkTek
+            for option, value in self.config_dict["Measurements"][data_label].get("options", {}).items():
+                setattr(self.instruments_query[data_label], option, value)
 
     def add_instrument(self, instrument=None, address=None, data_label=None, quantities=None):
         """
@@ -56,10 +65,11 @@ class LogMeasure:
         # in the module instruments
         InstrumentClass = getattr(instruments, instrument)
         self.instruments_query[data_label] = InstrumentClass(address)
+        self.instruments_query[data_label].requested_quantities = quantities
         ## Add entry to the data dictionnary
         for quantity in quantities:
             label = data_label + '_' + quantity
-            self.data_dict[label] = np.empty(0)
+            self.data_dict.add_column(label)
 
 
     def delete_instrument(self, data_label=None):
@@ -67,43 +77,102 @@ class LogMeasure:
         del self.config_dict["Measurements"][data_label]
 
     def initialize_instruments(self):
-        for instrument in self.instruments_query.values():
-            instrument.initialize()
+        # The instruments of different sessions are connected in parallel, the
+        # first error is raised once all of them are tried
+        groups = self.polling_groups()
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+            for future in [executor.submit(self.initialize_group, data_labels) for data_labels in groups]:
+                errors += future.result()
+        if errors:
+            raise errors[0]
+
+    def initialize_group(self, data_labels):
+        """Initializes the instruments of a group, returns the errors raised"""
+        errors = []
+        for data_label in data_labels:
+            try:
+                self.instruments_query[data_label].initialize()
+            except Exception as error:
+                print("Could not initialize " + data_label + ": " + str(error))
+                errors.append(error)
+        return errors
 
     def finalize_instruments(self):
         for instrument in self.instruments_query.values():
             instrument.finalize()
 
+    def polling_groups(self):
+        """
+        Group the data labels by instrument session: the labels of a group are
+        read one after the other, the groups are read in parallel.
+        """
+        groups = {}
+        for data_label, instrument in self.instruments_query.items():
+            groups.setdefault(instrument.session_key(), []).append(data_label)
+        return list(groups.values())
+
+    def poll_instruments(self, data_labels):
+        instrument = self.instruments_query[data_labels[0]]
+        channels = [self.config_dict["Measurements"][data_label]["channel"] for data_label in data_labels]
+        if hasattr(instrument, 'get_many_values'):
+            # All the channels of the instrument in one query, the objects of
+            # the labels give their requested quantities
+            instruments = [self.instruments_query[data_label] for data_label in data_labels]
+            return dict(zip(data_labels, instrument.get_many_values(channels, instruments)))
+        values = {}
+        for data_label, channel in zip(data_labels, channels):
+            values[data_label] = self.instruments_query[data_label].get_values(channel)
+        return values
+
     def get_values(self):
-        while self.keep_running:
-            # Time
-            current_time = self.data_dict['Time'][-1] + self.time_steps if self.data_dict['Time'].size else 0 # be zero for the first point
-            self.data_dict['Time'] = np.append(self.data_dict['Time'], current_time)
-            # Data
-            for data_label, instrument in self.instruments_query.items():
-                values = instrument.get_values(self.config_dict["Measurements"][data_label]["channel"])
-                for quantity in values.keys():
-                    full_label = data_label + '_' + quantity
-                    if full_label in self.data_dict:
-                        self.data_dict[full_label] = np.append(self.data_dict[full_label], values[quantity])
-            # Save log if saving is enabled
-            if self.saving:
-                self.save_log()
-            ## Sets how long each steps takes
-            data = {}
-            for key, values in self.data_dict.items():
-                if key not in ['S_AC','dT_AC', 'Phi_dT', 'Phi_VS', 'dPhi'] :
-                    data[key] = values[-1]
-            seebeck_obj = Seebeck(data)
-            seebeck_obj.analysis_ac()
-            data = seebeck_obj.data
-            self.data_dict['S_AC'] = np.append(self.data_dict['S_AC'], data['S_AC'])
-            self.data_dict['dT_AC'] = np.append(self.data_dict['dT_AC'], data['dT_AC'])
-            self.data_dict['Phi_dT'] = np.append(self.data_dict['Phi_dT'], data['Phi_dT'])
-            self.data_dict['Phi_VS'] = np.append(self.data_dict['Phi_VS'], data['Phi_VS'])
-            self.data_dict['dPhi'] = np.append(self.data_dict['dPhi'], data['dPhi'])
-            sleep(self.time_steps)
+        groups = self.polling_groups()
+        self.scheduler.period = self.time_steps
+        self.scheduler.start()
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+                while self.keep_running:
+                    self.acquire_point(executor, groups)
+                    ## Wait for the next point, without drift
+                    self.scheduler.wait()
+        finally:
+            ## Flush and close the log even if a reading fails
+            self.close_log()
 
+    def acquire_point(self, executor, groups):
+        row = {}
+        # Time
+        now = monotonic()
+        if self.time_origin is None or self.data_dict.size == 0:
+            self.time_origin = now # be zero for the first point
+        row['Time'] = now - self.time_origin
+        row['Timestamp'] = time() # same acquisition time for all the instruments
+        # Data, each instrument is read at its own period if "period" is
+        # defined in its config, otherwise at every point
+        futures = []
+        for data_labels in groups:
+            due_labels = [data_label for data_label in data_labels
+                          if self.scheduler.is_due(data_label, self.config_dict["Measurements"][data_label].get("period"))]
+            if due_labels:
+                futures.append(executor.submit(self.poll_instruments, due_labels))
+        for future in futures:
+            self.last_values.update(future.result())
+        # The instruments not read for this point keep their last values
+        for data_label, values in self.last_values.items():
+            for quantity in values.keys():
+                full_label = data_label + '_' + quantity
+                if full_label in self.data_dict:
+                    row[full_label] = values[quantity]
+        # Analysis
+        seebeck_obj = Seebeck(dict(row))
+        seebeck_obj.analysis_ac()
+        data = seebeck_obj.data
+        for key in Seebeck.ac_keys:
+            row[key] = data[key]
+        self.data_dict.append(row)
+        # Save log if saving is enabled
+        if self.saving:
+            self.save_log()
 
     def save_log(self):
         if self.keep_running:
@@ -113,18 +182,69 @@ class LogMeasure:
             if path is None:
                 path = ""
             filepath = os.path.join(path, file)
-            # Header
-            if os.path.isfile(filepath) is False:
-                with open(filepath, 'a') as file:
-                    header = [key for key in self.data_dict.keys()]
-                    line = "#" + ','.join(map(str, header)) + '\n'
-                    file.write(line)
-            # Values extraction
-            values = [self.data_dict[key][-1] for key in self.data_dict.keys()]
-            # Save values line by line
-            with open(filepath, 'a') as file:
-                line = ','.join(map(str, values)) + '\n'
-                file.write(line)
+            # Writer thread, (re)opened when the file changes
+            if self.log_writer is None or self.log_writer.filepath != filepath:
+                self.close_log(wait=False)
+                self.log_writer = self.open_writer(filepath, self.data_dict.keys())
+            # Values extraction, they are written by the writer thread
+            self.log_writer.write(tuple(self.data_dict.last().values()))
+            # All the points of the high rate channels, in their own files
+            for data_label, instrument in self.instruments_query.items():
+                if instrument.stream_data is not None:
+                    root, extension = os.path.splitext(filepath)
+                    self.save_stream(data_label, instrument.stream_data, root + '_' + data_label + extension)
+            self.check_writers()
+
+    def save_stream(self, data_label, stream_data, filepath):
+        if data_label not in self.stream_writers or self.stream_writers[data_label][0].filepath != filepath:
+            if data_label in self.stream_writers:
+                self.close_writer(self.stream_writers[data_label][0])
+            # The points logged before the saving started are not saved
+            self.stream_writers[data_label] = [self.open_writer(filepath, stream_data.keys()), stream_data.count]
+        writer, saved_count = self.stream_writers[data_label]
+        count, columns = stream_data.snapshot(list(stream_data.keys()))
+        n_points = min(count - saved_count, len(columns[0]))
+        for values in zip(*[column[len(column) - n_points:] for column in columns]):
+            writer.write(values)
+        self.stream_writers[data_label][1] = count
+
+    def open_writer(self, filepath, header):
+        return LogWriter(filepath, header, metadata=self.config_dict,
+                         batch_size=self.config_dict['Saving'].get('batch_size', 100),
+                         flush_interval=self.config_dict['Saving'].get('flush_interval', 5),
+                         fsync=self.config_dict['Saving'].get('fsync', "batch"))
+
+    def check_writers(self):
+        """Stops the saving if a writer failed, instead of losing the points silently"""
+        writers = [self.log_writer] + [writer for writer, _ in self.stream_writers.values()]
+        failed = [writer for writer in writers if writer is not None and writer.error is not None]
+        if failed:
+            for writer in failed:
+                print("Saving stopped, could not write " + writer.filepath + ": " + str(writer.error))
+            self.save_error = failed[0].error
+            self.saving = False
+            self.close_log(wait=False) # opened again when the saving is enabled
+
+    def close_writer(self, writer):
+        """Close a writer without waiting for the disk, see close_log"""
+        writer.close(wait=False)
+        self.closing_writers.append(writer)
+
+    def close_log(self, wait=True):
+        """
+        Close the log files. With wait False, the acquisition does not wait
+        for the writers to write their last points, the next close_log does
+        """
+        if self.log_writer is not None:
+            self.close_writer(self.log_writer)
+            self.log_writer = None
+        for writer, _ in self.stream_writers.values():
+            self.close_writer(writer)
+        self.stream_writers = {}
+        if wait:
+            for writer in self.closing_writers:
+                writer.close()
+        self.closing_writers = [writer for writer in self.closing_writers if writer.thread.is_alive()]
 
     def start_logging(self):
         self.keep_running = True
@@ -140,8 +260,7 @@ class LogMeasure:
         self.keep_running = False
 
     def clear_data(self):
-        for keys in self.data_dict:
-            self.data_dict[keys] = np.empty(0)
+        self.data_dict.clear()
 
     def sequence(self):
         t_list = self.config_dict['Sequence']['steps']
@@ -158,10 +277,7 @@ class LogMeasure:
             sleep(2)
             self.saving = False
             # Wait for PPMS temperature to get stable
-            status = self.data_dict['Temperature_StatusTemperature'][-1]
-            while status != 1:
-                sleep(1)
-                status = self.data_dict['Temperature_StatusTemperature'][-1]
+            self.instruments_query['Temperature'].wait_stable()
             # Save Heat OFF
             self.saving = True
             sleep(180)
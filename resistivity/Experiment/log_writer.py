@@ -0,0 +1,96 @@
+import queue
+import threading
+from time import monotonic
+from .log_files import open_log_file
+
+
+class LogWriter:
+    """
+    Writes the logged points into the log file from a background thread.
+
+    The acquisition thread only puts the points in a queue (write), the
+    formatting and the disk access happen in the writer thread, by batches of
+    batch_size points or every flush_interval seconds, whichever comes first.
+
+    - filepath: the path of the log file, the points are appended to it. Its
+    extension selects the format (see log_files), .dat text by default
+    - header: the list of the column names, written if the file is new
+    - metadata: a dictionnary saved with the binary formats (the config)
+    - batch_size: number of points written at once
+    - flush_interval: maximum time in seconds a point waits before being written
+    - fsync: "batch" to force the data on the disk after each batch, "close"
+    only when closing the file, "never" to leave it to the operating system
+
+    If the file cannot be opened or written, the writer thread stops and
+    keeps the exception in error: the next points are not queued.
+    """
+    def __init__(self, filepath, header, metadata=None, batch_size=100, flush_interval=5, fsync="batch"):
+        self.filepath       = filepath
+        self.header         = list(header)
+        self.metadata       = metadata
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.fsync          = fsync
+        self.error          = None # exception raised in the writer thread
+        self.queue          = queue.Queue()
+        self.thread         = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, values):
+        """
+        Add a point (a sequence of values ordered as the header) to the queue.
+        Returns False if the writer failed (see error) and the point is lost
+        """
+        if self.error is not None:
+            return False
+        self.queue.put(values)
+        return True
+
+    def close(self, wait=True):
+        """
+        Write the remaining points and close the file. With wait False, the
+        writer thread finishes alone: join it with close() to wait for it
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+        if wait:
+            self.thread.join()
+
+    def _run(self):
+        try:
+            file = open_log_file(self.filepath, self.header, self.metadata)
+        except (OSError, ValueError) as error:
+            self.error = error
+            print("Could not open the log file " + self.filepath + ": " + str(error))
+            return
+        try:
+            self._write_batches(file)
+        except OSError as error:
+            self.error = error
+            print("Could not write the log file " + self.filepath + ": " + str(error))
+        finally:
+            file.close()
+
+    def _write_batches(self, file):
+        batch = []
+        last_flush = monotonic()
+        closing = False
+        while not closing:
+            timeout = max(self.flush_interval - (monotonic() - last_flush), 0)
+            try:
+                values = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                values = ()
+            if values is None:
+                closing = True
+            elif values:
+                batch.append(values)
+            if closing or len(batch) >= self.batch_size or monotonic() - last_flush >= self.flush_interval:
+                if batch:
+                    file.write(batch)
+                    if self.fsync == "batch":
+                        file.sync()
+                    batch = []
+                last_flush = monotonic()
+        if self.fsync == "close":
+            file.sync()
@@ -0,0 +1,59 @@
+from time import monotonic, sleep
+
+
+class Scheduler:
+    """
+    Timing of the acquisition loop on a fixed grid of the monotonic clock.
+
+    The deadline of the tick n is t0 + n * period, so the time spent querying
+    the instruments does not accumulate as a drift. When a tick ends after its
+    deadline (overrun), the missed ticks are skipped and accounted for in
+    overruns, missed_ticks and overrun_time.
+
+    - period: the time between two ticks in seconds
+    """
+    def __init__(self, period=1):
+        self.period = period
+        self.start()
+
+    def start(self):
+        self.t0           = monotonic()
+        self.tick         = 0
+        self.overruns     = 0 # number of ticks that ended after the next deadline
+        self.missed_ticks = 0 # number of ticks skipped because of overruns
+        self.overrun_time = 0 # total time spent after the deadlines, in seconds
+        self._next_due    = {}
+
+    def wait(self):
+        """
+        Sleep until the deadline of the next tick. Returns False if the
+        deadline had already passed (overrun), True otherwise.
+        """
+        self.tick += 1
+        delay = self.t0 + self.tick * self.period - monotonic()
+        if delay >= 0:
+            sleep(delay)
+            return True
+        ## Overrun: start the next tick right away, on the grid
+        missed = int(-delay // self.period)
+        self.overruns     += 1
+        self.overrun_time += -delay
+        self.missed_ticks += missed
+        self.tick         += missed
+        return False
+
+    def is_due(self, key, period=None):
+        """
+        For an instrument read every period seconds (the tick period if None),
+        returns True if it has to be read during the current tick. key
+        identifies the instrument, for example its data label.
+        """
+        if period is None or period <= self.period:
+            return True
+        now = monotonic()
+        next_due = self._next_due.get(key, now)
+        if next_due > now + self.period / 2: # not before the middle of this tick
+            return False
+        # Next reading on the grid of this instrument, after now
+        self._next_due[key] = next_due + period * (1 + max(now - next_due, 0) // period)
+        return True
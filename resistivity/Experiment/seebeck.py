@@ -1,4 +1,5 @@
 import numpy as np
+from .thermocouples import get_thermocouple
 
 
 class Seebeck(): 
@@ -21,34 +22,17 @@ class Seebeck():
         self.data['VS_Y'] = self.data['VS_R']*np.sin(self.data['VS_theta']*2*np.pi/360)
         self.data['T0'] = self.data['Temperature_Temperature']
 
-        # Load coefficients of thermocouples for E = f(T_Celsius) where E is in Volts
-        self.coeff_E_below_273K = np.array([0, 5.8665508708E1, 4.5410977124E-2, -7.7998048686E-4,
-                                    -2.5800160843E-5, -5.9452583057E-7, -9.3214058667E-9,
-                                    -1.0287605534E-10, -8.0370123621E-13, -4.3979497391E-15,
-                                    -1.6414776355E-17, -3.9673619516E-20, -5.5827328721E-23,
-                                    -3.4657842013E-26])[::-1]*1e-6
-        self.coeff_E_above_273K = np.array([0, 5.8665508710E1, 4.5032275582E-2, 2.8908407212E-5,
-                                    -3.3056896652E-7, 6.5024403270E-10, -1.9197495504E-13,
-                                    -1.2536600497E-15, 2.1489217569E-18, -1.4388041782E-21,
-                                    3.5960899481E-25])[::-1]*1e-6
+        # Thermocouple used for T+ and T-
+        self.thermocouple = get_thermocouple("E")
 
     def Sther(self, T_Kelvin):
         """
         This function returns the Seebeck coefficient of the thermocouple
         concerned (by default type "E") at a certain temperature. The input of the
-        function is a temperature in Kelvin, but the coefficients below are for a
-        polynomial function with T in Celsius. The output is S in [V / K]
+        function is a temperature in Kelvin, the calibration polynomials are
+        in the thermocouples module. The output is S in [V / K]
         """
-        # Convert T_Kelvin to Celsius
-        x = T_Kelvin - 273.15
-        # T < 273 K
-        E_below = np.poly1d(self.coeff_E_below_273K)  # is a poly1d object in Volt
-        S_below = np.polyder(E_below)  # is a poly1d object in Volt / Celsius
-        # T > 273 K
-        E_above = np.poly1d(self.coeff_E_above_273K)  # is a poly1d object in Volt
-        S_above = np.polyder(E_above)  # is a poly1d object in Volt / Celsius
-        S_values = np.piecewise(x, [x <= 0, x > 0], [S_below(x), S_above(x)]) # is in Volt / K
-        return S_values
+        return self.thermocouple.S(T_Kelvin) # is in Volt / K
 
     
     # def Sther(self,T_Kelvin, Type = "E"):
@@ -116,15 +100,20 @@ class Seebeck():
     #     return S_values
     
     def analysis_ac(self):
-        Tp_X = self.data["V+_X"] / self.Sther(self.data['T0'])
-        Tp_Y = self.data["V+_Y"] / self.Sther(self.data['T0'])
-        Tm_X = self.data["V-_X"] / self.Sther(self.data['T0'])
-        Tm_Y = self.data["V-_Y"] / self.Sther(self.data['T0'])
+        S_T0 = self.Sther(self.data['T0'])
+        Tp_X = self.data["V+_X"] / S_T0
+        Tp_Y = self.data["V+_Y"] / S_T0
+        Tm_X = self.data["V-_X"] / S_T0
+        Tm_Y = self.data["V-_Y"] / S_T0
         self.data['dT_AC'] = np.sqrt((Tp_X-Tm_X)**2+(Tp_Y-Tm_Y)**2) # delta T R
         self.data['Phi_dT'] = 180/np.pi* np.arctan2(Tp_Y - Tm_Y, Tp_X - Tm_X)
         self.data['Phi_VS'] = self.data['VS_theta']
         self.data['dPhi'] = self.data["VS_theta"] - self.data['Phi_dT']
         self.data['S_AC'] = - np.abs(self.data["VS_R"]/ self.data['dT_AC']) * np.cos(np.pi/180 * self.data['dPhi'])               
+
+    ## Columns needed by analysis_ac, and columns it computes
+    raw_keys = ['T+_R', 'T+_theta', 'T-_R', 'T-_theta', 'VS_R', 'VS_theta', 'Temperature_Temperature']
+    ac_keys = ['S_AC', 'dT_AC', 'Phi_dT', 'Phi_VS', 'dPhi']
         
     # def analysis_dc(self,noise_obj=0):
     #     if not noise_obj == 0:
@@ -176,4 +165,36 @@ class Seebeck():
     #     E_values = np.piecewise(x, [x <= 0, x > 0],
     #                  [lambda x: np.polyval(self.coeff_E_below_273K,x),
     #                   lambda x: np.polyval(self.coeff_E_above_273K,x)])
-    #     return E_values
\ No newline at end of file
+    #     return E_values
+
+
+
+def iter_analysis_ac(data, chunk_size=1000000):
+    """
+    Runs analysis_ac on whole columns, chunk_size points at a time, so that
+    the runs larger than the memory can be analysed from a memory-mapped log
+    (see log_files.read_log). data is a dictionnary {column: array}.
+    Yields for each chunk the index of its first point and a dictionnary
+    {column: array} of the computed columns (Seebeck.ac_keys).
+    """
+    length = len(data[Seebeck.raw_keys[0]])
+    for start in range(0, length, chunk_size):
+        chunk = {key: np.asarray(data[key][start:start + chunk_size], dtype=float)
+                 for key in Seebeck.raw_keys}
+        seebeck_obj = Seebeck(chunk)
+        seebeck_obj.analysis_ac()
+        yield start, {key: seebeck_obj.data[key] for key in Seebeck.ac_keys}
+
+
+def analysis_ac(data, chunk_size=1000000):
+    """
+    Vectorized analysis_ac of a whole run. data is a dictionnary
+    {column: array}, for example the output of log_files.read_log. Returns a
+    dictionnary {column: array} of the computed columns (Seebeck.ac_keys).
+    """
+    length = len(data[Seebeck.raw_keys[0]])
+    results = {key: np.empty(length) for key in Seebeck.ac_keys}
+    for start, chunk in iter_analysis_ac(data, chunk_size):
+        for key in Seebeck.ac_keys:
+            results[key][start:start + len(chunk[key])] = chunk[key]
+    return results
@@ -0,0 +1,70 @@
+from functools import lru_cache
+import numpy as np
+
+
+## Coefficients of the thermocouples for E = f(T_Celsius) where E is in microVolts,
+## from the constant term to the highest order, below and above 0 Celsius
+coefficients = {
+    "E": {"below": [0, 5.8665508708E1, 4.5410977124E-2, -7.7998048686E-4,
+                    -2.5800160843E-5, -5.9452583057E-7, -9.3214058667E-9,
+                    -1.0287605534E-10, -8.0370123621E-13, -4.3979497391E-15,
+                    -1.6414776355E-17, -3.9673619516E-20, -5.5827328721E-23,
+                    -3.4657842013E-26],
+          "above": [0, 5.8665508710E1, 4.5032275582E-2, 2.8908407212E-5,
+                    -3.3056896652E-7, 6.5024403270E-10, -1.9197495504E-13,
+                    -1.2536600497E-15, 2.1489217569E-18, -1.4388041782E-21,
+                    3.5960899481E-25]},
+}
+
+
+class Thermocouple:
+    """
+    Seebeck coefficient S = dE/dT of a thermocouple, in Volt / K.
+
+    The coefficients of the derivative are computed once, and S is evaluated
+    with Horner's method on the polynomial of the temperature range of each
+    point only. The values for scalar temperatures are memoized, as the
+    online analysis asks several times for the same temperature.
+    Use get_thermocouple to share the objects.
+    """
+    def __init__(self, thermocouple_type="E"):
+        self.type = thermocouple_type
+        # Derivative coefficients in Volt / Celsius, highest order first for Horner
+        self.dcoeff_below = self._derivative(coefficients[thermocouple_type]["below"])
+        self.dcoeff_above = self._derivative(coefficients[thermocouple_type]["above"])
+        self._S_scalar = lru_cache(maxsize=4096)(self._evaluate_scalar)
+
+    @staticmethod
+    def _derivative(coeff):
+        return tuple(k * coeff[k] * 1e-6 for k in range(len(coeff) - 1, 0, -1))
+
+    @staticmethod
+    def _horner(dcoeff, x):
+        result = dcoeff[0]
+        for c in dcoeff[1:]:
+            result = result * x + c
+        return result
+
+    def _evaluate_scalar(self, T_Kelvin):
+        x = T_Kelvin - 273.15
+        return self._horner(self.dcoeff_below if x <= 0 else self.dcoeff_above, x)
+
+    def S(self, T_Kelvin):
+        """Seebeck coefficient in Volt / K at T_Kelvin, a number or an array"""
+        if np.ndim(T_Kelvin) == 0:
+            return self._S_scalar(float(T_Kelvin))
+        x = np.asarray(T_Kelvin, dtype=float) - 273.15
+        S_values = np.empty_like(x)
+        below = x <= 0
+        S_values[below] = self._horner(self.dcoeff_below, x[below])
+        S_values[~below] = self._horner(self.dcoeff_above, x[~below])
+        return S_values
+
+
+_thermocouples = {}
+
+def get_thermocouple(thermocouple_type="E"):
+    """Returns the Thermocouple object of this type, created once"""
+    if thermocouple_type not in _thermocouples:
+        _thermocouples[thermocouple_type] = Thermocouple(thermocouple_type)
+    return _thermocouples[thermocouple_type]
@@ -0,0 +1,113 @@
+import numpy as np
+from resistivity.Experiment.data_buffer import DataBuffer
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max envelope of one column of a DataBuffer, used to
+    plot long series with about as many points as pixels.
+
+    The level L of the pyramid splits the points in blocks of factor**L points,
+    and stores for each block the index and value of its minimum and maximum.
+    Plotting the minimum and maximum of each block, in their order, keeps the
+    envelope of the curve. The levels are updated with the new points only
+    (update), each level being built from the blocks of the level below.
+
+    The indices are absolute: the index of a point is the count of the buffer
+    when it was appended (see DataBuffer.count).
+
+    - max_length: the max_length of the DataBuffer, to bound the memory
+    - factor: number of blocks of a level gathered in one block of the next one
+    """
+    max_levels = 16
+
+    def __init__(self, max_length=None, factor=4):
+        self.max_length = max_length
+        self.factor     = factor
+        self.reset(0)
+
+    def reset(self, origin):
+        self.origin = origin # absolute index of the first point of the first block
+        self.levels = []     # levels[L - 1] is the level L, as DataBuffers
+
+    def _add_level(self):
+        level = len(self.levels) + 1
+        # The blocks of the buffer, plus the ones waiting to be gathered in the next level
+        max_length = None if self.max_length is None else self.max_length // self.factor**level + 2 * self.factor
+        self.levels.append(DataBuffer(['imin', 'ymin', 'imax', 'ymax'], max_length=max_length))
+
+    def update(self, y, count):
+        """
+        Adds the new points to the pyramid. y is the view of the column and
+        count the count of the DataBuffer when y was taken (see DataBuffer.snapshot).
+        """
+        first = count - len(y) # absolute index of y[0]
+        consumed = self.origin + (self.levels[0].count * self.factor if self.levels else 0)
+        if consumed < first:
+            # Points dropped before being processed: start again from the oldest kept block
+            self.reset(first)
+            consumed = first
+        if count - consumed < self.factor:
+            return
+        if not self.levels:
+            self._add_level()
+        ## Level 1 from the points
+        n_blocks = (count - consumed) // self.factor
+        start = consumed - first
+        values = np.asarray(y[start:start + n_blocks * self.factor], dtype=float)
+        indices = consumed + np.arange(n_blocks * self.factor)
+        self._add_blocks(self.levels[0], indices, values, indices, values, n_blocks)
+        ## Higher levels from the level below
+        for L in range(1, self.max_levels):
+            below = self.levels[L - 1]
+            if L == len(self.levels):
+                if below.count < self.factor:
+                    break
+                if self.max_length is not None and self.factor**(L + 1) > self.max_length:
+                    break # blocks larger than the buffer
+                self._add_level()
+            level = self.levels[L]
+            n_blocks = (below.count - level.count * self.factor) // self.factor
+            if n_blocks == 0:
+                break
+            start = level.count * self.factor - (below.count - below.size)
+            rows = slice(start, start + n_blocks * self.factor)
+            self._add_blocks(level, below['imin'][rows], below['ymin'][rows],
+                             below['imax'][rows], below['ymax'][rows], n_blocks)
+
+    def _add_blocks(self, level, imin, ymin, imax, ymax, n_blocks):
+        shape = (n_blocks, self.factor)
+        ymin = ymin.reshape(shape)
+        ymax = ymax.reshape(shape)
+        rows = np.arange(n_blocks)
+        argmin = np.argmin(ymin, axis=1)
+        argmax = np.argmax(ymax, axis=1)
+        level.extend({'imin': imin.reshape(shape)[rows, argmin], 'ymin': ymin[rows, argmin],
+                      'imax': imax.reshape(shape)[rows, argmax], 'ymax': ymax[rows, argmax]})
+
+    def indices(self, start, stop, n_pixels):
+        """
+        Absolute indices of the points to plot between the absolute indices
+        start and stop, sorted, with at most about 4 points per pixel.
+        """
+        level = 0
+        while level < len(self.levels) and (stop - start) // self.factor**level > 2 * n_pixels:
+            level += 1
+        return self._indices(level, start, stop)
+
+    def _indices(self, level, start, stop):
+        if level == 0 or start >= stop:
+            return np.arange(start, max(start, stop))
+        block_size = self.factor**level
+        blocks = self.levels[level - 1]
+        offset = blocks.count - blocks.size # blocks dropped from the DataBuffer
+        # Blocks entirely between start and stop, the edges come from the level below
+        first_block = max(-(-(start - self.origin) // block_size), offset)
+        last_block = min((stop - self.origin) // block_size, blocks.count)
+        if first_block >= last_block:
+            return self._indices(level - 1, start, stop)
+        rows = slice(first_block - offset, last_block - offset)
+        indices = np.sort(np.stack([blocks['imin'][rows], blocks['imax'][rows]], axis=1), axis=1).ravel()
+        return np.concatenate([self._indices(level - 1, start, self.origin + first_block * block_size),
+                               indices.astype(np.int64),
+                               self._indices(level - 1, self.origin + last_block * block_size, stop)])
@@ -8,6 +8,7 @@ from time import time
 import numpy as np
 import yaml
 import resistivity.Device.instruments as instruments
+from .decimation import MinMaxPyramid
 
 class MainWindow(QMainWindow):
     def __init__(self, log=None):
@@ -74,6 +75,11 @@ class MainWindow(QMainWindow):
         else:
             self.start_button.setEnabled(True)
             self.stop_button.setEnabled(False)
+        if self.log.save_error is not None:
+            # The saving stopped, the log file could not be written
+            self.save_data_checkbox.setChecked(False)
+            self.save_data_checkbox.setToolTip(str(self.log.save_error))
+            self.log.save_error = None
 
     def closeEvent(self, event):
         """Override the closeEvent (when the user press on the close button)"""
@@ -93,11 +99,13 @@ class GraphWindow(QWidget):
         self.log = log
         self.x_axis = []
         self.y_axis = {}
-        self.graph_data = {}
+        self.first_point = 0 # count of log.data_dict when the graph was cleared
+        self.plot_state = None # what is displayed, to redraw only when it changes
         self.graph_initial_time = 0
         self.del_button = None
 
         self.plot_items = {}  # Dictionary to hold plot items for each data series
+        self.pyramids = {}  # Min/max decimation of each data series
 
         self.color_graph = "#a9a7ab"        ## Initialize the graph plot
         self.init_plot()
@@ -128,7 +136,6 @@ class GraphWindow(QWidget):
 
         # Initialize the list for y-axis
         for key in self.log.data_dict.keys():
-            self.graph_data[key] = np.empty(0)
             self.x_axis_menu.addItem(f'{key}')
             # item = QListWidgetItem(f'{key}')
             # item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
@@ -151,6 +158,8 @@ class GraphWindow(QWidget):
         self.timer.start(int(self.log.time_steps*1e3))
 
         self.x_axis_menu.currentIndexChanged.connect(self.x_axis_menu_index_changed)
+        # Zooming or panning changes the decimation of the data
+        self.plot.sigXRangeChanged.connect(lambda *args: self.update_plot())
         #self.y_axis_menu.itemChanged.connect(self.y_axis_menu_index_changed)
         self.clear_graph_button.clicked.connect(self.clear_graph_button_clicked)
 
@@ -305,21 +314,38 @@ class GraphWindow(QWidget):
         self.y_items = [self.y_axis_menu.item(i).text() for i in range(self.y_axis_menu.count()) if self.y_axis_menu.item(i).checkState() == Qt.Checked]
 
     def update_plot(self):
-        if self.log.keep_running:
-            for key in self.graph_data.keys():
-                if key == 'Time':
-                    current_time = self.graph_data['Time'][-1] + self.log.time_steps if self.graph_data['Time'].size else 0
-                    self.graph_data['Time'] = np.append(self.graph_data['Time'], current_time)
+        data_dict = self.log.data_dict
+        rolling_points = self.rolling_points_box.value() if self.rolling_checkbox.isChecked() else None
+        view_range = None if self.plot.vb.autoRangeEnabled()[0] else tuple(self.plot.vb.viewRange()[0])
+        n_pixels = max(int(self.plot.vb.width()), 100)
+        state = (data_dict.count, self.x_item, tuple(self.y_items), rolling_points, view_range, n_pixels)
+        if state != self.plot_state:
+            # Redraw only if there are new points or the displayed items changed
+            self.plot_state = state
+            for i, y_item in enumerate(self.y_items):
+                # Views of the log data, no copy
+                count, (x_data, y_data) = data_dict.snapshot([self.x_item, y_item])
+                first = count - len(x_data) # index of x_data[0] in data_dict.count
+                # Points since the graph was cleared, or the last rolling_points
+                start, stop = max(first, self.first_point), count
+                if rolling_points is not None:
+                    start = max(start, count - rolling_points)
+                # Only the visible points when zoomed, if x is sorted
+                if view_range is not None and self.x_item in ['Time', 'Timestamp'] and start < stop:
+                    visible = np.searchsorted(x_data[start - first:stop - first], view_range) + start
+                    start, stop = max(start, visible[0] - 1), min(stop, visible[1] + 1)
+                # Min/max decimation to about the number of pixels
+                if y_item not in self.pyramids:
+                    self.pyramids[y_item] = MinMaxPyramid(data_dict.max_length)
+                self.pyramids[y_item].update(y_data, count)
+                indices = self.pyramids[y_item].indices(start, stop, n_pixels) - first
+                x_data, y_data = x_data[indices], y_data[indices]
+                color = self.assigned_colors.get(y_item, 'k')  # Default to black if not assigned
+                pen = pg.mkPen(color=color, width=2)
+                if y_item not in self.plot_items:
+                    self.plot_items[y_item] = self.plot.plot(x_data, y_data, pen=pen, name=y_item)
                 else:
-                    self.graph_data[key] = np.append(self.graph_data[key], self.log.data_dict[key][-1])
-
-        for i, y_item in enumerate(self.y_items):
-            color = self.assigned_colors.get(y_item, 'k')  # Default to black if not assigned
-            pen = pg.mkPen(color=color, width=2)
-            if y_item not in self.plot_items:
-                self.plot_items[y_item] = self.plot.plot(self.graph_data[self.x_item], self.graph_data[y_item], pen=pen, name=y_item)
-            else:
-                self.plot_items[y_item].setData(self.graph_data[self.x_item], self.graph_data[y_item])
+                    self.plot_items[y_item].setData(x_data, y_data)
 
         unchecked_items = set(self.plot_items.keys()) - set(self.y_items)
         for item_name in unchecked_items:
@@ -327,8 +353,9 @@ class GraphWindow(QWidget):
             self.plot.removeItem(plot_item)
 
     def clear_graph_button_clicked(self):
-        for keys in self.graph_data.keys():
-            self.graph_data[keys] = np.empty(0)
+        # Only the points logged from now on will be displayed
+        self.first_point = self.log.data_dict.count
+        self.plot_state = None
         self.graph_initial_time = 0
 
 
@@ -402,8 +429,9 @@ class DevicesWindow(QWidget):
         self.log.config_dict = {}
         self.log.load_config()
         # Reset the data and instruments dictionnaries before filling them again
-        self.log.data_dict = {'Time': np.empty(0)}
+        self.log.data_dict.reset(['Time', 'Timestamp'])
         self.log.instruments_query = {}
+        self.log.last_values = {}
         # Restart the logging
         self.log.keep_running = True
         # Clear the table of the previous instruments.
@@ -559,7 +587,7 @@ class FileWindow(QtWidgets.QDialog):
         self.select_file_button.clicked.connect(self.select_file_button_clicked)
 
     def select_file_button_clicked(self):
-        log_file_path, _ = QFileDialog.getSaveFileName(self, "Select a file", "", "DAT Files (*.dat)")
+        log_file_path, _ = QFileDialog.getSaveFileName(self, "Select a file", "", "DAT Files (*.dat);;NPY log directories (*.npylog)")
         #example_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'Example')
         #total_path = os.path.relpath(log_file_path,example_path)
         log_path, log_file = os.path.split(log_file_path)